@@ -7,6 +7,7 @@ import unittest
 import posixpath
 import random
 import string
+from concurrent.futures import ThreadPoolExecutor
 from functools import wraps
 from contextlib import contextmanager
 from client import SeafDavClient, USER, PASSWORD
@@ -175,6 +176,40 @@ class SeafDAVTestCase(unittest.TestCase):
         _test_under_path('/level1-folder-%s/level2-folder-%s' %
                          (randstring(5), randstring(5)))
 
+    @use_tmp_repo
+    def test_put_new_file(self):
+        """Test PUT of new files, also when the file is created concurrently"""
+        repo = TEST_REPO
+        fname = 'new-file-%s.txt' % randstring()
+        davclient.repo_uploadfile(repo, io.BytesIO(b'new content'), '/' + fname)
+        entries = api.list_dir_by_path(repo.get('id'), '/')
+        self.assertEqual([e.obj_name for e in entries], [fname])
+        assert davclient.repo_getfile(repo, '/' + fname) == b'new content'
+
+        # The file is created by another client after seafdav found it missing
+        # (seafdav still uses the cached head): the PUT must overwrite it
+        raced_fname = 'raced-file-%s.txt' % randstring()
+        with self.assertRaises(WebDAVOperationFailed):
+            davclient.repo_getfile(repo, '/' + raced_fname)
+        testfpath = os.path.join(os.path.dirname(__file__), 'data', 'test.txt')
+        api.post_file(repo.get('id'), testfpath, '/', raced_fname, USER)
+        davclient.repo_uploadfile(repo, io.BytesIO(b'dav content'), '/' + raced_fname)
+        names = [e.obj_name for e in api.list_dir_by_path(repo.get('id'), '/')]
+        self.assertEqual(sorted(names), sorted([fname, raced_fname]))
+        assert davclient.repo_getfile(repo, '/' + raced_fname) == b'dav content'
+
+        # Concurrent PUTs of the same new name
+        concurrent_fname = 'concurrent-file-%s.txt' % randstring()
+        contents = [('content %d' % i).encode() for i in range(8)]
+        def _put(content):
+            SeafDavClient().repo_uploadfile(repo, io.BytesIO(content),
+                                            '/' + concurrent_fname)
+        with ThreadPoolExecutor(len(contents)) as pool:
+            list(pool.map(_put, contents))
+        names = [e.obj_name for e in api.list_dir_by_path(repo.get('id'), '/')]
+        self.assertEqual(sorted(names), sorted([fname, raced_fname, concurrent_fname]))
+        assert davclient.repo_getfile(repo, '/' + concurrent_fname) in contents
+
     def test_copy_move(self):
         """Test copy/move files and folders."""
         # XXX: python-easwebday does not support webdav COPY/MOVE operation yet.
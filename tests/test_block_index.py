@@ -0,0 +1,46 @@
+# (c) 2009-2024 Martin Wendt and contributors; see WsgiDAV https://github.com/mar10/wsgidav
+# Licensed under the MIT license:
+# http://www.opensource.org/licenses/mit-license.php
+"""Unit tests for wsgidav.block_index"""
+import os
+import shutil
+import unittest
+from tempfile import mkdtemp
+
+from wsgidav.block_index import BlockIndex
+
+
+class BasicTest(unittest.TestCase):
+    """Test block_index.BlockIndex()."""
+
+    def setUp(self):
+        self.tmpdir = mkdtemp()
+        self.path = os.path.join(self.tmpdir, "block_index.db")
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def testReadWrite(self):
+        index = BlockIndex(self.path)
+        assert index.get("f1") is None
+        index.put("f1", [10, 20, 25])
+        assert list(index.get("f1")) == [10, 20, 25]
+        # Entries are immutable
+        index.put("f1", [1, 2, 3])
+        assert list(index.get("f1")) == [10, 20, 25]
+        # Visible to other instances (e.g. other worker processes)
+        other = BlockIndex(self.path)
+        assert list(other.get("f1")) == [10, 20, 25]
+
+    def testPurge(self):
+        index = BlockIndex(self.path, max_files=3)
+        for i in range(5):
+            index.put(f"f{i}", [i])
+        index.purge()
+        assert index.get("f0") is None
+        assert index.get("f1") is None
+        assert [list(index.get(f"f{i}")) for i in range(2, 5)] == [[2], [3], [4]]
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -3,12 +3,14 @@
 # http://www.opensource.org/licenses/mit-license.php
 """Unit test for lock_manager.py"""
 import os
+import shutil
 import unittest
-from tempfile import gettempdir
+from tempfile import gettempdir, mkdtemp
 from time import sleep
 
 from wsgidav.dav_error import DAVError
 from wsgidav.lock_man import lock_manager, lock_storage
+from wsgidav.lock_man.lock_storage_sqlite import LockStorageSQLite
 
 try:
     from wsgidav.lock_man.lock_storage_redis import LockStorageRedis
@@ -365,6 +367,48 @@ class BasicTest(unittest.TestCase):
         )
         assert lock is None, "Could acquire a conflicting child lock (same principal)"
 
+    def testLockLists(self):
+        """Lock manager should find locks of subtrees, parents and url lists."""
+        lm = self.lm
+        for url, depth in (
+            ("/dav/res", "infinity"),
+            ("/dav/res/sub", "0"),
+            ("/dav/res/sub/deep", "0"),
+            ("/dav/ressub", "0"),
+            ("/other", "0"),
+        ):
+            lm._generate_lock(
+                self.principal, "write", "shared", depth, self.owner, url, self.timeout
+            )
+
+        children = lm.storage.get_lock_list(
+            "/dav/res", include_root=False, include_children=True, token_only=False
+        )
+        assert sorted(lock["root"] for lock in children) == [
+            "/dav/res/sub",
+            "/dav/res/sub/deep",
+        ]
+        res = lm.get_url_lock_list("/", recursive=True)
+        assert len(res) == 5
+
+        # Depth-0 parent locks don't protect children
+        res = lm.get_indirect_url_lock_list("/dav/res/sub/deep/file")
+        assert [lock["root"] for lock in res] == ["/dav/res"]
+
+        res = lm.get_url_lock_lists(["/dav/res/", "/dav/res/sub", "/dav/none"])
+        assert [lock["root"] for lock in res["/dav/res/"]] == ["/dav/res"]
+        assert [lock["root"] for lock in res["/dav/res/sub"]] == ["/dav/res/sub"]
+        assert res["/dav/none"] == []
+
+        # Released locks are removed from the index
+        lm.remove_all_locks_from_url("/dav/res/sub", recursive=True)
+        res = lm.get_url_lock_list("/", recursive=True)
+        assert sorted(lock["root"] for lock in res) == [
+            "/dav/res",
+            "/dav/ressub",
+            "/other",
+        ]
+
 
 # ========================================================================
 # ShelveTest
@@ -394,6 +438,71 @@ class ShelveTest(BasicTest):
 #             os.remove(self.path)
 
 
+# ========================================================================
+# SQLiteTest
+# ========================================================================
+class SQLiteTest(BasicTest):
+    """Test lock_manager.LockManager(LockStorageSQLite)."""
+
+    def setUp(self):
+        self.tmpdir = mkdtemp()
+        self.path = os.path.join(self.tmpdir, "wsgidav-locks.db")
+        storage = LockStorageSQLite(self.path)
+        self.lm = lock_manager.LockManager(storage)
+        self.lm._verbose = 2
+
+    def tearDown(self):
+        self.lm.storage.close()
+        self.lm = None
+        shutil.rmtree(self.tmpdir)
+
+    def testShared(self):
+        """Locks should be visible to other storage instances (i.e. processes)."""
+        lock = self.lm.acquire(
+            url="/dav/res",
+            lock_type="write",
+            lock_scope="exclusive",
+            lock_depth="infinity",
+            lock_owner=self.owner,
+            timeout=self.timeout,
+            principal=self.principal,
+            token_list=[],
+        )
+        other = lock_manager.LockManager(LockStorageSQLite(self.path))
+        assert other.get_lock(lock["token"], key="root") == "/dav/res"
+        self.assertRaises(
+            DAVError,
+            other.acquire,
+            url="/dav/res/sub",
+            lock_type="write",
+            lock_scope="exclusive",
+            lock_depth="0",
+            lock_owner=self.owner,
+            timeout=self.timeout,
+            principal="another principal",
+            token_list=[],
+        )
+        other.release(lock["token"])
+        assert self.lm.get_lock(lock["token"]) is None
+        other.storage.close()
+
+    def testDefaultTimeout(self):
+        """A lock without timeout should get the default timeout."""
+        storage = self.lm.storage
+        lock = storage.create(
+            "/dav/res",
+            {
+                "type": "write",
+                "scope": "exclusive",
+                "depth": "0",
+                "owner": self.owner,
+                "principal": self.principal,
+            },
+        )
+        assert lock["timeout"] == LockStorageSQLite.LOCK_TIME_OUT_DEFAULT
+        assert storage.get(lock["token"])["timeout"] == lock["timeout"]
+
+
 class RedisTest(BasicTest):
     _redis_connect_failed = None
 
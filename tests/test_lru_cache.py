@@ -0,0 +1,82 @@
+# (c) 2009-2024 Martin Wendt and contributors; see WsgiDAV https://github.com/mar10/wsgidav
+# Licensed under the MIT license:
+# http://www.opensource.org/licenses/mit-license.php
+"""Unit tests for wsgidav.lru_cache"""
+import time
+import unittest
+
+from wsgidav.lru_cache import LRUCache
+
+
+class BasicTest(unittest.TestCase):
+    """Test lru_cache.LRUCache()."""
+
+    def testGetSet(self):
+        cache = LRUCache(10)
+        assert cache.get("a") is None
+        assert cache.get("a", 42) == 42
+        cache.set("a", 1)
+        assert cache.get("a") == 1
+        assert "a" in cache
+        assert "b" not in cache
+        assert cache.pop("a") == 1
+        assert cache.get("a") is None
+        assert len(cache) == 0
+
+    def testEviction(self):
+        cache = LRUCache(2)
+        cache.set("a", 1)
+        cache.set("b", 2)
+        # Touch 'a', so 'b' is the least recently used entry
+        assert cache.get("a") == 1
+        cache.set("c", 3)
+        assert len(cache) == 2
+        assert cache.get("b") is None
+        assert cache.get("a") == 1
+        assert cache.get("c") == 3
+
+    def testCost(self):
+        cache = LRUCache(10, max_cost=100)
+        cache.set("a", 1, cost=40)
+        cache.set("b", 2, cost=40)
+        assert cache.total_cost == 80
+        cache.set("c", 3, cost=40)
+        # 'a' was evicted to stay within budget
+        assert cache.get("a") is None
+        assert cache.total_cost == 80
+        # Replacing an entry updates the total cost
+        cache.set("b", 2, cost=10)
+        assert cache.total_cost == 50
+        # Entries that exceed the whole budget are not stored
+        cache.set("d", 4, cost=101)
+        assert cache.get("d") is None
+        assert cache.pop("c") == 3
+        assert cache.total_cost == 10
+
+    def testDisabled(self):
+        cache = LRUCache(0)
+        cache.set("a", 1)
+        assert cache.get("a") is None
+        assert len(cache) == 0
+
+    def testTTL(self):
+        cache = LRUCache(10, ttl=0.05)
+        cache.set("a", 1)
+        assert cache.get("a") == 1
+        time.sleep(0.1)
+        assert cache.get("a") is None
+        assert len(cache) == 0
+
+    def testRemoveIf(self):
+        cache = LRUCache(10)
+        for i in range(6):
+            cache.set(i, i * 10)
+        removed = cache.remove_if(lambda k, v: v >= 30)
+        assert removed == 3
+        assert sorted(cache._data.keys()) == [0, 1, 2]
+        cache.clear()
+        assert len(cache) == 0
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -3,10 +3,13 @@
 # http://www.opensource.org/licenses/mit-license.php
 """Unit test for property_manager.py"""
 import os
+import shutil
 import unittest
-from tempfile import gettempdir
+from tempfile import gettempdir, mkdtemp
 
+from wsgidav.fs_dav_provider import FilesystemProvider
 from wsgidav.prop_man import property_manager
+from wsgidav.prop_man.sqlite_property_manager import SQLitePropertyManager
 
 # ========================================================================
 # BasicTest
@@ -79,6 +82,22 @@ class BasicTest(unittest.TestCase):
         pm.write_property(url, "foo", "my name is joe")
         assert pm.get_property(url, "foo") == "my name is joe"
 
+    def testRemoveChildren(self):
+        """remove_properties(with_children) should remove the whole subtree."""
+        pm = self.pm
+        for url in ("/a", "/a/b", "/a/b/c", "/ab"):
+            pm.write_property(url, "{ns1:}foo", url)
+
+        pm.remove_properties("/a/b")
+        assert pm.get_properties("/a/b") == []
+        assert pm.get_property("/a/b/c", "{ns1:}foo") == "/a/b/c"
+
+        pm.remove_properties("/a", with_children=True)
+        assert pm.get_properties("/a") == []
+        assert pm.get_properties("/a/b/c") == []
+        assert pm.get_property("/ab", "{ns1:}foo") == "/ab"
+        pm.remove_properties("/ab")
+
 
 # ========================================================================
 # ShelveTest
@@ -109,6 +128,109 @@ class ShelveTest(BasicTest):
 #        os.remove(self.path)
 
 
+# ========================================================================
+# SQLiteTest
+# ========================================================================
+class SQLiteTest(BasicTest):
+    """Test sqlite_property_manager.SQLitePropertyManager()."""
+
+    def setUp(self):
+        self.tmpdir = mkdtemp()
+        self.path = os.path.join(self.tmpdir, "wsgidav-props.db")
+        self.pm = SQLitePropertyManager(self.path)
+        self.pm._verbose = 2
+
+    def tearDown(self):
+        self.pm._close()
+        self.pm = None
+        shutil.rmtree(self.tmpdir)
+
+    def testSubtree(self):
+        """Recursive operations should only touch the subtree."""
+        pm = self.pm
+        for url in ("/a", "/a/b", "/a/b/c", "/ab", "/x"):
+            pm.write_property(url, "{ns1:}foo", url)
+        pm.write_property("/a", "{ns1:}bar", b"<bar/>")
+
+        res = pm.get_properties_for_urls(["/a", "/ab", "/none"])
+        assert res == {
+            "/a": {"{ns1:}foo": "/a", "{ns1:}bar": b"<bar/>"},
+            "/ab": {"{ns1:}foo": "/ab"},
+            "/none": {},
+        }
+
+        # Copy replaces the properties of the destination
+        pm.write_property("/x", "{ns1:}baz", "/x")
+        pm.copy_properties("/a", "/x")
+        assert sorted(pm.get_properties("/x")) == ["{ns1:}bar", "{ns1:}foo"]
+        assert pm.get_property("/x", "{ns1:}foo") == "/a"
+        assert pm.get_properties("/x/b") == []
+
+        pm.move_properties("/a", "/m", with_children=True)
+        assert pm.get_properties("/a/b") == []
+        assert pm.get_property("/m/b", "{ns1:}foo") == "/a/b"
+        assert pm.get_property("/ab", "{ns1:}foo") == "/ab"
+
+        pm.remove_properties("/m", with_children=True)
+        assert pm.get_properties_for_urls(["/m", "/m/b", "/m/b/c"]) == {
+            "/m": {},
+            "/m/b": {},
+            "/m/b/c": {},
+        }
+        # Visible to other instances (e.g. other worker processes)
+        other = SQLitePropertyManager(self.path)
+        assert other.get_property("/ab", "{ns1:}foo") == "/ab"
+        other._close()
+
+    def testRemoveAllProperties(self):
+        """Deleting a collection should remove the properties of its members."""
+        root = os.path.join(self.tmpdir, "root")
+        os.makedirs(os.path.join(root, "a", "b"))
+        provider = FilesystemProvider(root)
+        provider.set_share_path("/dav")
+        provider.set_prop_manager(self.pm)
+        environ = {"wsgidav.provider": provider, "wsgidav.config": {}}
+
+        urls = ["/dav/a", "/dav/a/b", "/dav/a/b/c.txt", "/dav/ab"]
+        for url in urls:
+            self.pm.write_property(url, "{ns1:}foo", url)
+        provider.get_resource_inst("/a", environ).remove_all_properties(
+            recursive=True
+        )
+        assert self.pm.get_properties_for_urls(urls) == {
+            "/dav/a": {},
+            "/dav/a/b": {},
+            "/dav/a/b/c.txt": {},
+            "/dav/ab": {"{ns1:}foo": "/dav/ab"},
+        }
+
+    def testRemoveAllPropertiesCalls(self):
+        """Only collections should request the removal of children."""
+        calls = []
+
+        class LegacyPropertyManager(property_manager.PropertyManager):
+            # remove_properties() without `with_children` support
+            def remove_properties(self, norm_url, environ=None):
+                calls.append(norm_url)
+
+        root = os.path.join(self.tmpdir, "root")
+        os.makedirs(os.path.join(root, "a"))
+        with open(os.path.join(root, "a", "c.txt"), "w"):
+            pass
+        provider = FilesystemProvider(root)
+        provider.set_share_path("/dav")
+        provider.set_prop_manager(LegacyPropertyManager())
+        environ = {"wsgidav.provider": provider, "wsgidav.config": {}}
+
+        provider.get_resource_inst("/a/c.txt", environ).remove_all_properties(
+            recursive=True
+        )
+        provider.get_resource_inst("/a", environ).remove_all_properties(
+            recursive=True
+        )
+        assert calls == ["/dav/a/c.txt", "/dav/a/"]
+
+
 # ========================================================================
 
 
@@ -0,0 +1,247 @@
+# (c) 2009-2024 Martin Wendt and contributors; see WsgiDAV https://github.com/mar10/wsgidav
+# Licensed under the MIT license:
+# http://www.opensource.org/licenses/mit-license.php
+"""Unit tests for the Seafile provider's file streams and caches."""
+import threading
+import time
+import unittest
+from types import SimpleNamespace
+from unittest import mock
+
+from wsgidav import util  # noqa: F401 (import before dav_error)
+from wsgidav.dav_error import HTTP_INTERNAL_ERROR, DAVError
+
+try:
+    from wsgidav import seafile_dav_provider
+except ImportError:
+    seafile_dav_provider = None
+
+
+class FakeBlockManager:
+    """Serves blocks from a dict {block_id: bytes} and records the loads."""
+
+    def __init__(self, blocks):
+        self.blocks = blocks
+        self.loaded = []
+
+    def load_block(self, store_id, version, block_id):
+        self.loaded.append(block_id)
+        return self.blocks.get(block_id)
+
+    def stat_block(self, store_id, version, block_id):
+        return len(self.blocks[block_id])
+
+
+def make_file(blocks, obj_id="f1"):
+    """Return a SeafFile-like object that consists of `blocks`."""
+    return SimpleNamespace(
+        obj_id=obj_id,
+        store_id="store",
+        version=1,
+        blocks=list(blocks),
+        size=sum(len(data or b"") for data in blocks.values()),
+    )
+
+
+# ========================================================================
+# StreamTest
+# ========================================================================
+class StreamTest(unittest.TestCase):
+    """Test seafile_dav_provider.SeafileStream."""
+
+    def setUp(self):
+        if seafile_dav_provider is None:
+            raise unittest.SkipTest("Test requires the Seafile modules")
+        # Five blocks of 10 bytes: b"0000000000", b"1111111111", ...
+        self.blocks = {f"b{i}": str(i).encode() * 10 for i in range(5)}
+        self.data = b"".join(self.blocks.values())
+        self.block_mgr = FakeBlockManager(self.blocks)
+        patcher = mock.patch.object(seafile_dav_provider, "block_mgr", self.block_mgr)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.block_map = seafile_dav_provider.BlockMapCache(1024 * 1024)
+
+    def open_stream(self, read_ahead=0, blocks=None):
+        patcher = mock.patch.object(
+            seafile_dav_provider, "READ_AHEAD_BLOCKS", read_ahead
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        if blocks is not None:
+            self.block_mgr.blocks = blocks
+        stream = seafile_dav_provider.SeafileStream(
+            make_file(self.block_mgr.blocks), self.block_map
+        )
+        self.addCleanup(stream.close)
+        return stream
+
+    def testRead(self):
+        """Reads may start and end anywhere in a block."""
+        stream = self.open_stream()
+        assert stream.read(3) == self.data[:3]
+        # Rest of a block, then across two block boundaries
+        assert stream.read(7) == self.data[3:10]
+        assert stream.read(25) == self.data[10:35]
+        # Whole blocks are returned without copying
+        assert stream.read(5) == self.data[35:40]
+        assert stream.read(10) is self.blocks["b4"]
+        assert stream.read(10) == b""
+
+    def testReadInto(self):
+        """readinto() should fill the buffer across block boundaries."""
+        stream = self.open_stream()
+        buf = bytearray(15)
+        assert stream.readinto(buf) == 15
+        assert buf == self.data[:15]
+        assert stream.readinto(buf) == 15
+        assert buf == self.data[15:30]
+        assert stream.readinto(buf) == 15
+        assert buf == self.data[30:45]
+        # Short read at end of file
+        assert stream.readinto(buf) == 5
+        assert buf[:5] == self.data[45:]
+        assert stream.readinto(buf) == 0
+
+    def testSeek(self):
+        """seek() should position inside the right block."""
+        stream = self.open_stream(read_ahead=2)
+        stream.seek(25)
+        assert stream.read(10) == self.data[25:35]
+        stream.seek(10)
+        assert stream.read(3) == self.data[10:13]
+        stream.seek(0)
+        assert stream.read(12) == self.data[:12]
+        # Seeking to or past the end of file
+        stream.seek(len(self.data))
+        assert stream.read(10) == b""
+        stream.seek(len(self.data) + 100)
+        assert stream.read(10) == b""
+        buf = bytearray(10)
+        assert stream.readinto(buf) == 0
+
+    def testEmptyBlock(self):
+        """Empty blocks should be skipped."""
+        blocks = {"b0": b"abc", "b1": b"", "b2": b"def"}
+        stream = self.open_stream(blocks=blocks)
+        assert stream.read(10) == b"abcdef"
+        stream.seek(3)
+        assert stream.read(10) == b"def"
+
+    def testMissingBlock(self):
+        """A missing block should fail, not truncate the body."""
+        blocks = {"b0": b"abc", "b1": None, "b2": b"def"}
+        stream = self.open_stream(blocks=blocks)
+        assert stream.read(2) == b"ab"
+        with self.assertRaises(DAVError) as cm:
+            stream.read(10)
+        assert cm.exception.value == HTTP_INTERNAL_ERROR
+
+    def testReadAheadLimit(self):
+        """Blocks after the requested range should not be read ahead."""
+        stream = self.open_stream(read_ahead=2)
+        stream.seek(5)
+        stream.limit_read_ahead(12)
+        assert stream.read(7) == self.data[5:12]
+        assert set(stream.prefetched) == set()
+
+        # The next part of a multipart response
+        stream.seek(31)
+        stream.limit_read_ahead(33)
+        assert stream.read(2) == self.data[31:33]
+        assert set(stream.prefetched) == set()
+        assert self.block_mgr.loaded == ["b0", "b1", "b3"]
+
+        # Without a limit, the following blocks are read ahead
+        stream.seek(0)
+        assert stream.read(5) == self.data[:5]
+        assert set(stream.prefetched) == {1, 2}
+
+
+# ========================================================================
+# BlockMapCacheTest
+# ========================================================================
+class SlowBlockManager(FakeBlockManager):
+    """stat_block() blocks until `release` is set, then fails if `error`."""
+
+    def __init__(self, blocks, error=None):
+        super().__init__(blocks)
+        self.error = error
+        self.entered = threading.Event()
+        self.release = threading.Event()
+        self.stat_count = 0
+
+    def stat_block(self, store_id, version, block_id):
+        self.stat_count += 1
+        self.entered.set()
+        self.release.wait(5)
+        if self.error is not None:
+            raise self.error
+        return super().stat_block(store_id, version, block_id)
+
+
+class BlockMapCacheTest(unittest.TestCase):
+    """Test seafile_dav_provider.BlockMapCache."""
+
+    def setUp(self):
+        if seafile_dav_provider is None:
+            raise unittest.SkipTest("Test requires the Seafile modules")
+        self.blocks = {"b0": b"a" * 10, "b1": b"b" * 20, "b2": b"c" * 5}
+        self.file_obj = make_file(self.blocks)
+        self.block_map = seafile_dav_provider.BlockMapCache(1024 * 1024)
+
+    def run_getters(self, block_mgr, count=8):
+        """Call get_offsets() from `count` threads while the first one loads.
+
+        Returns the list of results (offsets or exceptions).
+        """
+        patcher = mock.patch.object(seafile_dav_provider, "block_mgr", block_mgr)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        results = []
+
+        def _get():
+            try:
+                results.append(list(self.block_map.get_offsets(self.file_obj)))
+            except Exception as e:
+                results.append(e)
+
+        threads = [threading.Thread(target=_get) for _ in range(count)]
+        threads[0].start()
+        # Start the other getters while the first one is loading
+        assert block_mgr.entered.wait(5)
+        for thread in threads[1:]:
+            thread.start()
+        time.sleep(0.1)
+        block_mgr.release.set()
+        for thread in threads:
+            thread.join(5)
+        assert len(results) == count
+        return results
+
+    def testSingleFlight(self):
+        """Concurrent getters for the same file should load it once."""
+        block_mgr = SlowBlockManager(self.blocks)
+        results = self.run_getters(block_mgr)
+        assert results == [[10, 30, 35]] * 8
+        assert block_mgr.stat_count == len(self.blocks)
+        # Cached now
+        assert list(self.block_map.get_offsets(self.file_obj)) == [10, 30, 35]
+        assert block_mgr.stat_count == len(self.blocks)
+
+    def testLoadError(self):
+        """A load error should reach all waiters, nothing is cached."""
+        error = OSError("block storage unavailable")
+        block_mgr = SlowBlockManager(self.blocks, error=error)
+        results = self.run_getters(block_mgr)
+        assert results == [error] * 8
+        assert block_mgr.stat_count == 1
+        assert self.block_map._cache.get(self.file_obj.obj_id) is None
+        assert not self.block_map._building
+
+        # The next call loads again
+        block_mgr.error = None
+        assert list(self.block_map.get_offsets(self.file_obj)) == [10, 30, 35]
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -19,6 +19,7 @@ from tests.util import create_test_folder
 from wsgidav import util
 from wsgidav.fs_dav_provider import FilesystemProvider
 from wsgidav.wsgidav_app import WsgiDAVApp
+from wsgidav.xml_tools import etree
 
 try:
     import webtest
@@ -159,6 +160,67 @@ class ServerTest(unittest.TestCase):
         # PUT a small file (expect '201 Created')
         app.put("/file1.txt", params=data1, status=201)
 
+    def testGetRanges(self):
+        """Serve single and multiple byte ranges."""
+        app = self.app
+        data = b"0123456789abcdefghijklmnopqrstuvwxyz"
+        app.put("/ranges.txt", params=data, status=201)
+
+        res = app.get("/ranges.txt", headers={"Range": "bytes=2-5"}, status=206)
+        assert res.body == b"2345"
+        assert res.headers["Content-Range"] == f"bytes 2-5/{len(data)}"
+
+        res = app.get(
+            "/ranges.txt", headers={"Range": "bytes=20-22,2-5,-3"}, status=206
+        )
+        content_type = res.headers["Content-Type"]
+        assert content_type.startswith("multipart/byteranges; boundary=")
+        assert "Content-Range" not in res.headers
+        assert int(res.headers["Content-Length"]) == len(res.body)
+
+        boundary = content_type.split("boundary=", 1)[1].encode()
+        parts = res.body.split(b"--" + boundary)
+        assert parts[0] == b""
+        assert parts[-1] == b"--\r\n"
+        expected = [(2, 5), (20, 22), (33, 35)]
+        assert len(parts[1:-1]) == len(expected)
+        for part, (start, end) in zip(parts[1:-1], expected):
+            headers, body = part.split(b"\r\n\r\n", 1)
+            assert f"Content-Range: bytes {start}-{end}/{len(data)}".encode() in headers
+            assert body == data[start : end + 1] + b"\r\n"
+
+    def testPropfind(self):
+        """Multistatus responses are buffered or streamed."""
+        app = self.app
+
+        def _propfind():
+            res = app.request(
+                "/",
+                method="PROPFIND",
+                headers={"Depth": "1"},
+                environ={"SERVER_PROTOCOL": "HTTP/1.1"},
+                status=207,
+            )
+            root = etree.fromstring(res.body)
+            hrefs = [el.text for el in root.iter("{DAV:}href")]
+            return res, hrefs
+
+        res, hrefs = _propfind()
+        assert int(res.headers["Content-Length"]) == len(res.body)
+        assert "/" in hrefs
+        assert "/readme.txt" in hrefs
+
+        # Force streaming after the first <response>
+        orig_size = util.MULTI_STATUS_BUFFER_SIZE
+        util.MULTI_STATUS_BUFFER_SIZE = 1
+        try:
+            res, streamed_hrefs = _propfind()
+        finally:
+            util.MULTI_STATUS_BUFFER_SIZE = orig_size
+        # Sent without Content-Length, but the connection can be kept alive
+        assert res.headers.get("Connection") != "close"
+        assert streamed_hrefs == hrefs
+
     def testEncoding(self):
         """Handle special characters."""
         app = self.app
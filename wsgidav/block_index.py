@@ -0,0 +1,102 @@
+"""
+BlockIndex
+
+Persistent, process-shared index of block offsets for Seafile file objects.
+
+For every file object id, the index stores the end offsets of its blocks
+(i.e. the prefix sums of the block sizes), so a byte position can be mapped
+to a block with a binary search instead of stat-ing every block.
+
+File objects are immutable, so entries never need to be updated. The index
+is an SQLite database in WAL mode, which allows all worker processes on a
+host to read and write it concurrently.
+"""
+import itertools
+import os
+import sqlite3
+import threading
+from array import array
+
+import wsgidav.util as util
+
+__docformat__ = "reStructuredText"
+
+_logger = util.get_module_logger(__name__)
+
+
+class BlockIndex:
+    """Map file object ids to an array of block end offsets.
+
+    path:
+        Path of the SQLite database file (created if missing).
+    max_files:
+        Oldest entries are purged when the index holds more files than this.
+    """
+
+    #: Check `max_files` after this many inserts
+    PURGE_INTERVAL = 1000
+
+    def __init__(self, path, *, max_files=100000):
+        self.path = path
+        self.max_files = max_files
+        self._local = threading.local()
+        # Shared by all threads: next() on a count is atomic
+        self._put_count = itertools.count(1)
+
+    def __repr__(self):
+        return f"{self.__class__.__name__}({self.path!r})"
+
+    def _get_connection(self):
+        # Connections can't be shared between threads or forked processes
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS block_index "
+                "(obj_id TEXT PRIMARY KEY, offsets BLOB NOT NULL)"
+            )
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def get(self, obj_id):
+        """Return the block end offsets for `obj_id` as array, or None."""
+        try:
+            row = (
+                self._get_connection()
+                .execute("SELECT offsets FROM block_index WHERE obj_id=?", (obj_id,))
+                .fetchone()
+            )
+        except sqlite3.Error as e:
+            _logger.warning(f"Failed to read block index {self.path}: {e}")
+            return None
+        if row is None:
+            return None
+        offsets = array("Q")
+        offsets.frombytes(row[0])
+        return offsets
+
+    def put(self, obj_id, offsets):
+        """Store the block end offsets (sequence of int) for `obj_id`."""
+        data = array("Q", offsets).tobytes()
+        try:
+            conn = self._get_connection()
+            conn.execute(
+                "INSERT OR IGNORE INTO block_index (obj_id, offsets) VALUES (?, ?)",
+                (obj_id, data),
+            )
+            if next(self._put_count) % self.PURGE_INTERVAL == 0:
+                self.purge()
+        except sqlite3.Error as e:
+            _logger.warning(f"Failed to write block index {self.path}: {e}")
+
+    def purge(self):
+        """Delete the oldest entries, so at most `max_files` remain."""
+        conn = self._get_connection()
+        conn.execute(
+            "DELETE FROM block_index WHERE rowid <= "
+            "(SELECT MAX(rowid) FROM block_index) - ?",
+            (self.max_files,),
+        )
@@ -112,6 +112,17 @@ _standardLivePropNames = [
     # "{DAV:}source", # removed in rfc4918
 ]
 _lockPropertyNames = ["{DAV:}lockdiscovery", "{DAV:}supportedlock"]
+# Getter methods of live properties that are answered by get_property_value()
+_livePropertyGetters = {
+    "{DAV:}creationdate": "get_creation_date",
+    "{DAV:}getcontenttype": "get_content_type",
+    "{DAV:}quota-used-bytes": "get_used_bytes",
+    "{DAV:}quota-available-bytes": "get_available_bytes",
+    "{DAV:}getlastmodified": "get_last_modified",
+    "{DAV:}getcontentlength": "get_content_length",
+    "{DAV:}getetag": "get_etag",
+    "{DAV:}displayname": "get_display_name",
+}
 
 
 # ========================================================================
@@ -177,6 +188,8 @@ class _DAVResource(ABC):
         self.is_collection: bool = is_collection
         self.environ: dict = environ
         self.name: str = util.get_uri_name(self.path)
+        # Results of live property getters (resources live for one request)
+        self._live_prop_memo: dict = {}
 
     def __repr__(self):
         return f"{self.__class__.__name__}({self.path!r})"
@@ -475,7 +488,7 @@ class _DAVResource(ABC):
         """Return a list _DAVResource objects of a collection (children,
         grand-children, ...).
 
-        This default implementation calls self.get_member_list() recursively.
+        This default implementation calls self.iter_descendants().
 
         This function may also be called for non-collections (with add_self=True).
 
@@ -488,34 +501,52 @@ class _DAVResource(ABC):
             depth : string
                 '0' | '1' | 'infinity'
         """
+        return list(
+            self.iter_descendants(
+                collections=collections,
+                resources=resources,
+                depth_first=depth_first,
+                depth=depth,
+                add_self=add_self,
+            )
+        )
+
+    def iter_descendants(
+        self,
+        *,
+        collections=True,
+        resources=True,
+        depth_first=False,
+        depth="infinity",
+        add_self=False,
+    ):
+        """Like get_descendants(), but yield the resources while walking the
+        tree, so large trees can be processed without holding all resources.
+
+        This default implementation calls self.get_member_list() recursively.
+        """
         assert depth in ("0", "1", "infinity")
-        res = []
         if add_self and not depth_first:
-            res.append(self)
+            yield self
         if depth != "0" and self.is_collection:
             for child in self.get_member_list():
-                if not child:
-                    self.get_member_list()
                 want = (collections and child.is_collection) or (
                     resources and not child.is_collection
                 )
                 if want and not depth_first:
-                    res.append(child)
+                    yield child
                 if child.is_collection and depth == "infinity":
-                    res.extend(
-                        child.get_descendants(
-                            collections=collections,
-                            resources=resources,
-                            depth_first=depth_first,
-                            depth=depth,
-                            add_self=False,
-                        )
+                    yield from child.iter_descendants(
+                        collections=collections,
+                        resources=resources,
+                        depth_first=depth_first,
+                        depth=depth,
+                        add_self=False,
                     )
                 if want and depth_first:
-                    res.append(child)
+                    yield child
         if add_self and depth_first:
-            res.append(self)
-        return res
+            yield self
 
     # --- Properties ---------------------------------------------------------
 
@@ -543,22 +574,22 @@ class _DAVResource(ABC):
 
         propNameList.append("{DAV:}resourcetype")
 
-        if self.get_creation_date() is not None:
+        if self._get_live_value("get_creation_date") is not None:
             propNameList.append("{DAV:}creationdate")
-        if self.get_content_length() is not None:
+        if self._get_live_value("get_content_length") is not None:
             assert not self.is_collection
             propNameList.append("{DAV:}getcontentlength")
-        if self.get_content_type() is not None:
+        if self._get_live_value("get_content_type") is not None:
             propNameList.append("{DAV:}getcontenttype")
-        if self.get_used_bytes() is not None:
+        if self._get_live_value("get_used_bytes") is not None:
             propNameList.append("{DAV:}quota-used-bytes")
-        if self.get_available_bytes() is not None:
+        if self._get_live_value("get_available_bytes") is not None:
             propNameList.append("{DAV:}quota-available-bytes")
-        if self.get_last_modified() is not None:
+        if self._get_live_value("get_last_modified") is not None:
             propNameList.append("{DAV:}getlastmodified")
-        if self.get_display_name() is not None:
+        if self._get_live_value("get_display_name") is not None:
             propNameList.append("{DAV:}displayname")
-        if self.get_etag() is not None:
+        if self._get_live_value("get_etag") is not None:
             propNameList.append("{DAV:}getetag")
 
         # Locking properties
@@ -568,12 +599,36 @@ class _DAVResource(ABC):
         # Dead properties
         if self.provider.prop_manager:
             refUrl = self.get_ref_url()
-            propNameList.extend(
-                self.provider.prop_manager.get_properties(refUrl, self.environ)
-            )
+            dead_props = self._get_prefetched_dead_properties(refUrl)
+            if dead_props is not None:
+                propNameList.extend(dead_props.keys())
+            else:
+                propNameList.extend(
+                    self.provider.prop_manager.get_properties(refUrl, self.environ)
+                )
 
         return propNameList
 
+    def _get_prefetched_dead_properties(self, ref_url):
+        """Return {name: value} if PROPFIND prefetched the dead properties, or None."""
+        # See RequestServer.do_PROPFIND()
+        dead_properties = self.environ.get("wsgidav.dead_properties")
+        if dead_properties is None:
+            return None
+        return dead_properties.get(ref_url)
+
+    def _get_live_value(self, getter_name):
+        """Return the result of a live property getter, e.g. "get_etag".
+
+        Getters are only called once per resource instance, i.e. per request,
+        since get_property_names() and get_property_value() both need them.
+        """
+        try:
+            return self._live_prop_memo[getter_name]
+        except KeyError:
+            value = self._live_prop_memo[getter_name] = getattr(self, getter_name)()
+            return value
+
     def get_properties(self, mode, *, name_list=None):
         """Return properties as list of 2-tuples (name, value).
 
@@ -644,14 +699,18 @@ class _DAVResource(ABC):
         Finally, other properties are considered *dead*, and are handled  by
         the associated property manager.
         """
-        refUrl = self.get_ref_url()
-
         # lock properties
         lm = self.provider.lock_manager
         if lm and name == "{DAV:}lockdiscovery":
             # TODO: we return HTTP_NOT_FOUND if no lockmanager is present.
             # Correct?
-            activelocklist = lm.get_url_lock_list(refUrl)
+            ref_url = self.get_ref_url()
+            # PROPFIND fetches the locks of all members in batches
+            lock_lists = self.environ.get("wsgidav.lock_lists")
+            if lock_lists is not None and ref_url in lock_lists:
+                activelocklist = lock_lists[ref_url]
+            else:
+                activelocklist = lm.get_url_lock_list(ref_url)
             lockdiscoveryEL = etree.Element(name)
             for lock in activelocklist:
                 activelockEL = etree.SubElement(lockdiscoveryEL, "{DAV:}activelock")
@@ -718,36 +777,28 @@ class _DAVResource(ABC):
 
         elif name.startswith("{DAV:}"):
             # Standard live property (raises HTTP_NOT_FOUND if not supported)
-            if name == "{DAV:}creationdate" and self.get_creation_date() is not None:
-                # Note: uses RFC3339 format (ISO 8601)
-                return util.get_rfc3339_time(self.get_creation_date())
-            elif name == "{DAV:}getcontenttype" and self.get_content_type() is not None:
-                return self.get_content_type()
-            elif name == "{DAV:}resourcetype":
+            if name == "{DAV:}resourcetype":
                 if self.is_collection:
                     resourcetypeEL = etree.Element(name)
                     etree.SubElement(resourcetypeEL, "{DAV:}collection")
                     return resourcetypeEL
                 return ""
-            elif name == "{DAV:}quota-used-bytes":
-                return self.get_used_bytes()
-            elif name == "{DAV:}quota-available-bytes":
-                return self.get_available_bytes()
-            elif (
-                name == "{DAV:}getlastmodified" and self.get_last_modified() is not None
-            ):
-                # Note: uses RFC1123 format
-                return util.get_rfc1123_time(self.get_last_modified())
-            elif (
-                name == "{DAV:}getcontentlength"
-                and self.get_content_length() is not None
-            ):
-                # Note: must be a numeric string
-                return str(self.get_content_length())
-            elif name == "{DAV:}getetag" and self.get_etag() is not None:
-                return self.get_etag()
-            elif name == "{DAV:}displayname" and self.get_display_name() is not None:
-                return self.get_display_name()
+            elif name in ("{DAV:}quota-used-bytes", "{DAV:}quota-available-bytes"):
+                return self._get_live_value(_livePropertyGetters[name])
+
+            getter_name = _livePropertyGetters.get(name)
+            value = self._get_live_value(getter_name) if getter_name else None
+            if value is not None:
+                if name == "{DAV:}creationdate":
+                    # Note: uses RFC3339 format (ISO 8601)
+                    return util.get_rfc3339_time(value)
+                elif name == "{DAV:}getlastmodified":
+                    # Note: uses RFC1123 format
+                    return util.get_rfc1123_time(value)
+                elif name == "{DAV:}getcontentlength":
+                    # Note: must be a numeric string
+                    return str(value)
+                return value
 
             # Unsupported, no persistence available, or property not found
             raise DAVError(HTTP_NOT_FOUND)
@@ -755,7 +806,12 @@ class _DAVResource(ABC):
         # Dead property
         pm = self.provider.prop_manager
         if pm:
-            value = pm.get_property(refUrl, name, self.environ)
+            refUrl = self.get_ref_url()
+            dead_props = self._get_prefetched_dead_properties(refUrl)
+            if dead_props is not None:
+                value = dead_props.get(name)
+            else:
+                value = pm.get_property(refUrl, name, self.environ)
             if value is not None:
                 return xml_tools.string_to_xml(value)
 
@@ -791,6 +847,9 @@ class _DAVResource(ABC):
         """
         assert value is None or xml_tools.is_etree_element(value)
 
+        if not dry_run:
+            self._live_prop_memo.clear()
+
         if name in _lockPropertyNames:
             # Locking properties are always read-only
             raise DAVError(
@@ -857,11 +916,23 @@ class _DAVResource(ABC):
         raise DAVError(HTTP_FORBIDDEN)
 
     def remove_all_properties(self, *, recursive):
-        """Remove all associated dead properties."""
-        if self.provider.prop_manager:
-            self.provider.prop_manager.remove_properties(
-                self.get_ref_url(), self.environ
-            )
+        """Remove all associated dead properties.
+
+        recursive:
+            True: also remove the properties of all members.
+        """
+        pm = self.provider.prop_manager
+        if not pm:
+            return
+        ref_url = self.get_ref_url()
+        if recursive and self.is_collection:
+            try:
+                pm.remove_properties(ref_url, self.environ, with_children=True)
+                return
+            except TypeError:
+                # Custom property manager without `with_children` support
+                pass
+        pm.remove_properties(ref_url, self.environ)
 
     # --- Locking ------------------------------------------------------------
 
@@ -908,6 +979,25 @@ class _DAVResource(ABC):
         assert self.is_collection
         raise DAVError(HTTP_FORBIDDEN)
 
+    def prepare_new_resource(self, name):
+        """Return a resource object for a new member that is about to be PUT.
+
+        Called by PUT for unmapped URLs. The returned resource is then written
+        using begin_write() / end_write().
+
+        Preconditions (to be ensured by caller):
+
+          - this must be a collection
+          - <self.path + name> must not exist
+          - there must be no conflicting locks
+
+        Providers may override this to create the member only when
+        end_write() is called, so a new file is stored in one step.
+        This default implementation calls create_empty_resource().
+        """
+        assert self.is_collection
+        return self.create_empty_resource(name)
+
     def create_collection(self, name):
         """Create a new collection as member of self.
 
@@ -1588,6 +1678,20 @@ class DAVProvider(ABC):
         """
         raise NotImplementedError
 
+    def get_resource_memo(self, environ: dict) -> dict:
+        """Return a {path: _DAVResource or None} dict for the current request.
+
+        Providers with an expensive get_resource_inst() may store the results
+        here, so middleware and request handlers that resolve the same path
+        share one resource instance.
+        Write operations must call invalidate_resource_memo().
+        """
+        return environ.setdefault("wsgidav.resource_memo", {})
+
+    def invalidate_resource_memo(self, environ: dict) -> None:
+        """Forget all resources memoized for the current request."""
+        environ.pop("wsgidav.resource_memo", None)
+
     def exists(self, path: str, environ: dict):
         """Return True, if path maps to an existing resource.
 
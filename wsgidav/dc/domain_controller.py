@@ -1,11 +1,14 @@
 import hashlib
+import hmac
 import base64
+import os
 import seahub.settings as seahub_settings
 from seaserv import ccnet_api as api
 from wsgidav.dc.seaf_utils import multi_tenancy_enabled
 from wsgidav.dc import seahub_db
 import wsgidav.util as util
 from wsgidav.dc.base_dc import BaseDomainController
+from wsgidav.lru_cache import LRUCache
 from sqlalchemy.sql import exists
 # basic_auth_user, get_domain_realm, require_authentication
 _logger = util.get_module_logger(__name__)
@@ -21,6 +24,26 @@ pad = lambda s: s + (16 - len(s) % 16) * PADDING
 # encrypt with AES, encode with base64
 EncodeAES = lambda c, s: base64.b64encode(c.encrypt(pad(s)))
 
+# Clients send Basic credentials with every request, so results of a full
+# login are cached for a short time, keyed on a salted hash of
+# (username, password). Failed logins are cached separately with their own
+# (shorter) TTL. A TTL of 0 disables the respective cache.
+AUTH_CACHE_TTL = float(os.environ.get('SEAFDAV_AUTH_CACHE_TTL', 30))
+AUTH_FAILURE_CACHE_TTL = float(os.environ.get('SEAFDAV_AUTH_FAILURE_CACHE_TTL', 5))
+AUTH_CACHE_SIZE = int(os.environ.get('SEAFDAV_AUTH_CACHE_SIZE', 10000))
+
+_auth_cache_salt = os.urandom(32)
+# {key: (ccnet_email, is_guest, org_id)}
+_auth_cache = LRUCache(AUTH_CACHE_SIZE if AUTH_CACHE_TTL > 0 else 0,
+                       ttl=AUTH_CACHE_TTL)
+_auth_failure_cache = LRUCache(AUTH_CACHE_SIZE if AUTH_FAILURE_CACHE_TTL > 0 else 0,
+                               ttl=AUTH_FAILURE_CACHE_TTL)
+
+
+def _auth_cache_key(username, password):
+    msg = username.encode('utf8') + b'\0' + password.encode('utf8')
+    return hmac.new(_auth_cache_salt, msg, hashlib.sha256).digest()
+
 
 class SeafileDomainController(BaseDomainController):
 
@@ -53,9 +76,66 @@ class SeafileDomainController(BaseDomainController):
         if "'" in username:
             return False
 
+        key = _auth_cache_key(username, password)
+        cached = _auth_cache.get(key)
+        if cached is not None:
+            ccnet_email, is_guest, org_id = cached
+            environ['seafile.is_guest'] = is_guest
+            if org_id is not None:
+                environ['seafile.org_id'] = org_id
+            environ["http_authenticator.username"] = ccnet_email
+            return True
+        if key in _auth_failure_cache:
+            return False
+
+        try:
+            ccnet_email = self._check_credentials(username, password)
+        except Exception as e:
+            # Not cached: the backend may be back with the next request
+            _logger.warning('Failed to login: %s', e)
+            return False
+        if not ccnet_email:
+            _auth_failure_cache.set(key, True)
+            return False
+
+        username = ccnet_email
+        # Only cache the result if all lookups succeeded
+        complete = True
+        is_guest = False
+        try:
+            user = api.get_emailuser_with_import(username)
+            if user.role == 'guest':
+                environ['seafile.is_guest'] = is_guest = True
+            else:
+                environ['seafile.is_guest'] = False
+        except Exception:
+            _logger.exception('get_emailuser')
+            complete = False
+
+        org_id = None
+        if multi_tenancy_enabled():
+            try:
+                orgs = api.get_orgs_by_user(username)
+                if orgs:
+                    environ['seafile.org_id'] = org_id = orgs[0].org_id
+            except Exception:
+                _logger.exception('get_orgs_by_user')
+                complete = False
+
+        environ["http_authenticator.username"] = username
+
+        if complete:
+            _auth_cache.set(key, (username, is_guest, org_id))
+        return True
+
+    def _check_credentials(self, username, password):
+        """Return the ccnet email if the credentials are valid, else None.
+
+        Raises an exception if the user database is not available.
+        """
+        session = None
         try:
             ccnet_email = None
-            session = None
             if self.session_cls:
                 session = self.session_cls()
 
@@ -73,7 +153,7 @@ class SeafileDomainController(BaseDomainController):
 
             if not ccnet_email:
                 _logger.warning('User %s doesn\'t exist', username)
-                return False
+                return None
 
             enable_webdav_secret = False
             if hasattr(seahub_settings, 'ENABLE_WEBDAV_SECRET'):
@@ -86,49 +166,24 @@ class SeafileDomainController(BaseDomainController):
             if enable_two_factor_auth:
                 if not enable_webdav_secret:
                     _logger.warning("Two factor auth is enabled, no access to webdav.")
-                    return False
+                    return None
                 else:
                     if not validate_secret(session, ccnet_email, password):
-                        return False
+                        return None
             else:
                 if not enable_webdav_secret:
                     if api.validate_emailuser(ccnet_email, password) != 0:
-                        return False
+                        return None
                 else:
                     if api.validate_emailuser(ccnet_email, password) != 0 and \
                             not validate_secret(session, ccnet_email, password):
-                        return False
+                        return None
 
-            username = ccnet_email
-        except Exception as e:
-            _logger.warning('Failed to login: %s', e)
-            return False
+            return ccnet_email
         finally:
             if session:
                 session.close()
 
-        try:
-            user = api.get_emailuser_with_import(username)
-            if user.role == 'guest':
-                environ['seafile.is_guest'] = True
-            else:
-                environ['seafile.is_guest'] = False
-        except Exception:
-            _logger.exception('get_emailuser')
-
-        if multi_tenancy_enabled():
-            try:
-                orgs = api.get_orgs_by_user(username)
-                if orgs:
-                    environ['seafile.org_id'] = orgs[0].org_id
-            except Exception:
-                _logger.exception('get_orgs_by_user')
-                pass
-
-        environ["http_authenticator.username"] = username
-
-        return True
-
 
 def validate_secret(session, ccnet_email, password):
 
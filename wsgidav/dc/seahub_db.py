@@ -1,4 +1,5 @@
 import os
+import time
 from urllib.parse import quote_plus
 
 from sqlalchemy import create_engine
@@ -13,12 +14,28 @@ import wsgidav.util as util
 Base = automap_base()
 _logger = util.get_module_logger(__name__)
 
+# Only these tables are used by the domain controller. Reflecting the whole
+# seahub schema would take most of the worker startup time.
+SEAHUB_TABLES = (
+    'profile_profile',
+    'options_useroptions',
+    'constance_config',
+    'two_factor_staticdevice',
+    'two_factor_totpdevice',
+)
+
+# Pooled connections that were in use less than this many seconds ago are
+# handed out without a ping.
+PING_IDLE_TIME = float(os.environ.get('SEAFDAV_DB_PING_IDLE_TIME', 30))
+
 
 def init_db_session_class():
     try:
         _logger.info('Init seahub database...')
         engine = create_seahub_db_engine()
-        Base.prepare(engine, reflect=True)
+        # Missing tables (e.g. two factor auth not installed) are skipped
+        Base.metadata.reflect(engine, only=lambda name, _meta: name in SEAHUB_TABLES)
+        Base.prepare()
         Session = sessionmaker(bind=engine)
         return Session
     except ImportError:
@@ -73,6 +90,7 @@ def create_seahub_db_engine():
         # We use has_event_listener to double check in case we call create_engine
         # multipe times in the same process.
         add_event_listener(Pool, 'checkout', ping_connection)
+        add_event_listener(Pool, 'checkin', record_checkin)
 
     return engine
 
@@ -82,8 +100,15 @@ def create_seahub_db_engine():
 # server beacause being idle for too long.
 #
 # See http://stackoverflow.com/a/17791117/1467959
+#
+# Connections that were checked in recently are assumed to be alive, so busy
+# workers don't pay a round trip for every checkout.
 # pylint: disable=unused-argument
 def ping_connection(dbapi_connection, connection_record, connection_proxy):
+    last_checkin = connection_record.info.get('last_checkin')
+    if last_checkin is None or time.monotonic() - last_checkin < PING_IDLE_TIME:
+        # New or recently used connection
+        return
     cursor = dbapi_connection.cursor()
     try:
         cursor.execute("SELECT 1")
@@ -96,3 +121,8 @@ def ping_connection(dbapi_connection, connection_record, connection_proxy):
 
         # Raise DisconnectionError so the pool would create a new connection
         raise DisconnectionError()
+
+
+# pylint: disable=unused-argument
+def record_checkin(dbapi_connection, connection_record):
+    connection_record.info['last_checkin'] = time.monotonic()
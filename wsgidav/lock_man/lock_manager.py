@@ -37,6 +37,7 @@ The lock data model is a dictionary with these fields:
 """
 import random
 import time
+from contextlib import nullcontext
 from pprint import pformat
 
 from wsgidav import util
@@ -70,6 +71,16 @@ def normalize_lock_root(path):
     return path
 
 
+def get_lock_root_and_parents(path):
+    """Return [path, parent, ..., '/'] as list of normalized lock roots."""
+    res = []
+    u = path
+    while u:
+        res.append(normalize_lock_root(u))
+        u = util.get_uri_parent(u)
+    return res
+
+
 def is_lock_expired(lock):
     expire = float(lock["expire"])
     return expire >= 0 and expire < time.time()
@@ -223,15 +234,26 @@ class LockManager:
         On error raise a DAVError with an embedded DAVErrorCondition.
         """
         url = normalize_lock_root(url)
+        # Storages that are shared by multiple processes may provide a
+        # transaction, so no other process can create a conflicting lock
+        # between the check and the creation
+        write_transaction = getattr(self.storage, "write_transaction", nullcontext)
         self._lock.acquire_write()
         try:
-            # Raises DAVError on conflict:
-            self._check_lock_permission(
-                url, lock_type, lock_scope, lock_depth, token_list, principal
-            )
-            return self._generate_lock(
-                principal, lock_type, lock_scope, lock_depth, lock_owner, url, timeout
-            )
+            with write_transaction():
+                # Raises DAVError on conflict:
+                self._check_lock_permission(
+                    url, lock_type, lock_scope, lock_depth, token_list, principal
+                )
+                return self._generate_lock(
+                    principal,
+                    lock_type,
+                    lock_scope,
+                    lock_depth,
+                    lock_owner,
+                    url,
+                    timeout,
+                )
         finally:
             self._lock.release()
 
@@ -284,6 +306,29 @@ class LockManager:
         )
         return lockList
 
+    def get_url_lock_lists(self, url_list):
+        """Return {url: list of lock_dict} with the direct, valid locks of multiple urls.
+
+        This needs only one storage call, if the storage implements
+        `get_lock_lists()`, e.g. to report the locks of all PROPFIND members.
+        Side effect: expired locks for these urls are purged.
+        """
+        url_list = list(url_list)
+        get_lock_lists = getattr(self.storage, "get_lock_lists", None)
+        if get_lock_lists is None:
+            # Custom storage that only implements the basic interface
+            return {url: self.get_url_lock_list(url) for url in url_list}
+        lock_lists = get_lock_lists(
+            {normalize_lock_root(url) for url in url_list}, token_only=False
+        )
+        return {url: lock_lists[normalize_lock_root(url)] for url in url_list}
+
+    def _get_url_and_parent_lock_lists(self, url):
+        """Return [(url, lock_list), (parent, lock_list), ..., ('/', lock_list)]."""
+        urls = get_lock_root_and_parents(url)
+        lock_lists = self.get_url_lock_lists(urls)
+        return [(u, lock_lists[u]) for u in urls]
+
     def get_indirect_url_lock_list(self, url, *, principal=None):
         """Return a list of valid lockDicts, that protect <path> directly or indirectly.
 
@@ -292,11 +337,7 @@ class LockManager:
         """
         url = normalize_lock_root(url)
         lockList = []
-        u = url
-        while u:
-            lock_list = self.storage.get_lock_list(
-                u, include_root=True, include_children=False, token_only=False
-            )
+        for u, lock_list in self._get_url_and_parent_lock_lists(url):
             for lock in lock_list:
                 if u != url and lock["depth"] != "infinity":
                     continue  # We only consider parents with Depth: infinity
@@ -306,7 +347,6 @@ class LockManager:
                 # continue  # Only compatible with shared locks by other users
                 if principal is None or principal == lock["principal"]:
                     lockList.append(lock)
-            u = util.get_uri_parent(u)
         return lockList
 
     def is_url_locked(self, url):
@@ -377,9 +417,7 @@ class LockManager:
         self._lock.acquire_read()
         try:
             # Check url and all parents for conflicting locks
-            u = url
-            while u:
-                lock_list = self.get_url_lock_list(u)
+            for u, lock_list in self._get_url_and_parent_lock_lists(url):
                 for lock in lock_list:
                     _logger.debug(f"    check parent {u}, {lock_string(lock)}")
                     if u != url and lock["depth"] != "infinity":
@@ -394,7 +432,6 @@ class LockManager:
                         f" -> DENIED due to locked parent {lock_string(lock)}"
                     )
                     errcond.add_href(lock["root"])
-                u = util.get_uri_parent(u)
 
             if lock_depth == "infinity":
                 # Check child URLs for conflicting locks
@@ -446,6 +483,7 @@ class LockManager:
         """
         assert util.is_str(url)
         assert depth in ("0", "infinity")
+        url = normalize_lock_root(url)
         _logger.debug(
             f"check_write_permission({url}, {depth}, {token_list}, {principal})"
         )
@@ -456,9 +494,7 @@ class LockManager:
         self._lock.acquire_read()
         try:
             # Check url and all parents for conflicting locks
-            u = url
-            while u:
-                lock_list = self.get_url_lock_list(u)
+            for u, lock_list in self._get_url_and_parent_lock_lists(url):
                 _logger.debug(f"  checking {u}")
                 for lock in lock_list:
                     _logger.debug(f"     lock={lock_string(lock)}")
@@ -474,7 +510,6 @@ class LockManager:
                             f" -> DENIED due to locked parent {lock_string(lock)}"
                         )
                         errcond.add_href(lock["root"])
-                u = util.get_uri_parent(u)
 
             if depth == "infinity":
                 # Check child URLs for conflicting locks
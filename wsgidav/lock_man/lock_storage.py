@@ -15,6 +15,7 @@ See :class:`~wsgidav.lock_man.lock_storage.LockStorageShelve`
 import os
 import shelve
 import time
+from bisect import bisect_left, insort
 
 from wsgidav import util
 from wsgidav.lock_man.lock_manager import (
@@ -58,6 +59,10 @@ class LockStorageDict:
     This is obviously not persistent, but should be enough in some cases.
     For a persistent implementation, see lock_storage.LockStorageShelve().
 
+    All locked paths are also kept in a sorted list, so the locks of a
+    subtree are found by a binary search for the path prefix instead of
+    scanning all entries.
+
     Notes:
         expire is stored as expiration date in seconds since epoch (not in
         seconds until expiration).
@@ -97,6 +102,8 @@ class LockStorageDict:
     def __init__(self):
         self._dict = None
         self._lock = ReadWriteLock()
+        #: Sorted list of all paths that have direct locks
+        self._roots = []
 
     def __repr__(self):
         return self.__class__.__name__
@@ -108,6 +115,29 @@ class LockStorageDict:
         """Overloaded by Shelve implementation."""
         pass
 
+    def _build_index(self):
+        """Rebuild the sorted list of locked paths from the stored entries."""
+        self._roots = sorted(
+            k[len("URL2TOKEN:") :] for k in self._dict if k.startswith("URL2TOKEN:")
+        )
+
+    def _remove_root(self, path):
+        i = bisect_left(self._roots, path)
+        if i < len(self._roots) and self._roots[i] == path:
+            del self._roots[i]
+
+    def _get_child_roots(self, path):
+        """Return all locked paths below <path> (not including <path>)."""
+        prefix = path.rstrip("/") + "/"
+        res = []
+        for i in range(bisect_left(self._roots, prefix), len(self._roots)):
+            root = self._roots[i]
+            if not root.startswith(prefix):
+                break
+            if root != path:
+                res.append(root)
+        return res
+
     def open(self):
         """Called before first use.
 
@@ -115,10 +145,12 @@ class LockStorageDict:
         """
         assert self._dict is None
         self._dict = {}
+        self._roots = []
 
     def close(self):
         """Called on shutdown."""
         self._dict = None
+        self._roots = []
 
     def cleanup(self):
         """Purge expired locks (optional)."""
@@ -128,6 +160,7 @@ class LockStorageDict:
         """Delete all entries."""
         if self._dict is not None:
             self._dict.clear()
+        self._roots = []
 
     def get(self, token):
         """Return a lock dictionary for a token.
@@ -208,6 +241,7 @@ class LockStorageDict:
             key = f"URL2TOKEN:{path}"
             if key not in self._dict:
                 self._dict[key] = [token]
+                insort(self._roots, path)
             else:
                 # Note: Shelve dictionary returns copies, so we must reassign
                 # values:
@@ -273,6 +307,7 @@ class LockStorageDict:
                     self._dict[key] = tokList
                 else:
                     del self._dict[key]
+                    self._remove_root(lock.get("root"))
             # Remove the lock
             del self._dict[token]
 
@@ -324,14 +359,42 @@ class LockStorageDict:
                 __appendLocks(tokList)
 
             if include_children:
-                for u, ltoks in self._dict.items():
-                    if util.is_child_uri(key, u):
-                        __appendLocks(ltoks)
+                # Note: __appendLocks() may purge expired locks, so we iterate
+                # over a copy
+                for root in self._get_child_roots(path):
+                    __appendLocks(self._dict.get(f"URL2TOKEN:{root}", []))
 
             return lockList
         finally:
             self._lock.release()
 
+    def get_lock_lists(self, path_list, *, token_only):
+        """Return the direct locks for multiple paths in one call.
+
+        Expired locks are *not* returned (but may be purged).
+
+        path_list:
+            Iterable of paths (utf8 encoded string)
+        token_only:
+            True: only lists of tokens are returned.
+        Returns:
+            Dictionary {path: list of valid lock dictionaries (may be empty)},
+            keyed by the paths as passed.
+        """
+        res = {}
+        self._lock.acquire_read()
+        try:
+            for path in path_list:
+                res[path] = self.get_lock_list(
+                    path,
+                    include_root=True,
+                    include_children=False,
+                    token_only=token_only,
+                )
+            return res
+        finally:
+            self._lock.release()
+
 
 # ========================================================================
 # LockStorageShelve
@@ -369,6 +432,7 @@ class LockStorageShelve(LockStorageDict):
             if len(self._dict):
                 self._dict.clear()
                 self._dict.sync()
+            self._roots = []
             if was_closed:
                 self.close()
         finally:
@@ -379,6 +443,7 @@ class LockStorageShelve(LockStorageDict):
         # Open with writeback=False, which is faster, but we have to be
         # careful to re-assign values to _dict after modifying them
         self._dict = shelve.open(self._storage_path, writeback=False)
+        self._build_index()
 
     #        if __debug__ and self._verbose >= 2:
     #                self._check("After shelve.open()")
@@ -391,5 +456,6 @@ class LockStorageShelve(LockStorageDict):
             if self._dict is not None:
                 self._dict.close()
                 self._dict = None
+            self._roots = []
         finally:
             self._lock.release()
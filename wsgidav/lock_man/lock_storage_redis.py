@@ -2,6 +2,20 @@
 # Original PyFileServer (c) 2005 Ho Chun Wei.
 # Licensed under the MIT license:
 # http://www.opensource.org/licenses/mit-license.php
+"""
+Implements a lock storage provider for `LockManager` using redis.
+
+Keys (with the default prefix)::
+
+    wsgidav-lock:<token>        pickled lock dictionary, expires with the lock
+    wsgidav-URL2TOKEN:<path>    list of tokens that directly lock <path>
+    wsgidav-lockroots           sorted set of all locked paths
+
+All members of the sorted set have the same score, so the locks of a subtree
+can be found with ZRANGEBYLEX instead of a KEYS scan of the whole keyspace.
+Mutations that touch several keys are run as Lua scripts, so concurrent
+workers always see a consistent index.
+"""
 import pickle
 import time
 
@@ -17,12 +31,42 @@ from wsgidav.lock_man.lock_manager import (
 
 _logger = util.get_module_logger(__name__)
 
+# KEYS: lock key, URL2TOKEN key, index key
+# ARGV: pickled lock, ttl, token, path
+_CREATE_SCRIPT = """
+redis.call('SET', KEYS[1], ARGV[1], 'EX', ARGV[2])
+redis.call('RPUSH', KEYS[2], ARGV[3])
+redis.call('ZADD', KEYS[3], 0, ARGV[4])
+return 1
+"""
+
+# Remove tokens from the URL2TOKEN list of one path and delete their locks.
+# The path is dropped from the index when no tokens are left.
+# KEYS: URL2TOKEN key, index key, lock keys...
+# ARGV: path, tokens...
+_REMOVE_SCRIPT = """
+for i = 2, #ARGV do
+    redis.call('LREM', KEYS[1], 0, ARGV[i])
+end
+if redis.call('LLEN', KEYS[1]) == 0 then
+    redis.call('ZREM', KEYS[2], ARGV[1])
+end
+local deleted = 0
+for i = 3, #KEYS do
+    deleted = deleted + redis.call('DEL', KEYS[i])
+end
+return deleted
+"""
+
 
 class LockStorageRedis:
     """
     A (high performance?) lock manager implementation using redis!
     """
 
+    #: Number of keys per SCAN/DEL round trip in clear()
+    SCAN_COUNT = 1000
+
     def __init__(self, *, host="127.0.0.1", port=6379, db=0, password=None):
         super().__init__()
         self._redis_host = host
@@ -32,7 +76,10 @@ class LockStorageRedis:
         self._redis_prefix = "wsgidav-{}"
         self._redis_lock_prefix = self._redis_prefix.format("lock:{}")
         self._redis_url2token_prefix = self._redis_prefix.format("URL2TOKEN:{}")
+        self._redis_index_key = self._redis_prefix.format("lockroots")
         self._redis = None
+        self._create_script = None
+        self._remove_script = None
 
     LOCK_TIME_OUT_DEFAULT = 604800  # 1 week, in seconds
     LOCK_TIME_OUT_MAX = 4 * 604800  # 1 month, in seconds
@@ -57,10 +104,16 @@ class LockStorageRedis:
             db=self._redis_db,
             password=self._redis_password,
         )
+        self._create_script = self._redis.register_script(_CREATE_SCRIPT)
+        self._remove_script = self._redis.register_script(_REMOVE_SCRIPT)
+        if not self._redis.exists(self._redis_index_key):
+            self.rebuild_index()
 
     def close(self):
         """Called on shutdown."""
         self._redis = None
+        self._create_script = None
+        self._remove_script = None
 
     def cleanup(self):
         """Purge expired locks (optional)."""
@@ -68,9 +121,39 @@ class LockStorageRedis:
     def clear(self):
         """Delete all entries."""
         if self._redis is not None:
-            keys = self._redis.keys(self._redis_prefix.format("*"))
-            for key in keys:
-                self._redis.delete(key)
+            keys = []
+            for key in self._redis.scan_iter(
+                match=self._redis_prefix.format("*"), count=self.SCAN_COUNT
+            ):
+                keys.append(key)
+                if len(keys) >= self.SCAN_COUNT:
+                    self._redis.delete(*keys)
+                    keys = []
+            if keys:
+                self._redis.delete(*keys)
+
+    def rebuild_index(self):
+        """Add all locked paths to the index.
+
+        Only needed for lock entries that were written by a previous version,
+        which did not maintain the index.
+        """
+        url2token_prefix = self._redis_url2token_prefix.format("")
+        paths = []
+        for key in self._redis.scan_iter(
+            match=self._redis_url2token_prefix.format("*"), count=self.SCAN_COUNT
+        ):
+            paths.append(key.decode("utf-8")[len(url2token_prefix) :])
+        if paths:
+            self._redis.zadd(self._redis_index_key, {p: 0 for p in paths})
+        return len(paths)
+
+    def _remove_tokens(self, path, tokens, *, delete_locks, client=None):
+        """Remove tokens from the URL2TOKEN list of <path> (atomically)."""
+        keys = [self._redis_url2token_prefix.format(path), self._redis_index_key]
+        if delete_locks:
+            keys.extend(self._redis_lock_prefix.format(t) for t in tokens)
+        return self._remove_script(keys=keys, args=[path, *tokens], client=client)
 
     def get(self, token):
         """Return a lock dictionary for a token.
@@ -83,9 +166,8 @@ class LockStorageRedis:
         """
         lock = self._redis.get(self._redis_lock_prefix.format(token))
         if lock is None:
-            # Lock not found: purge dangling URL2TOKEN entries
-            _logger.debug(f"Lock purged dangling: {token}")
-            self.delete(token)
+            # Lock not found (the URL2TOKEN entry is purged by get_lock_list())
+            _logger.debug(f"Lock not found: {token}")
             return None
         lock = pickle.loads(lock)
         expire = float(lock["expire"])
@@ -133,17 +215,15 @@ class LockStorageRedis:
         token = generate_lock_token()
         lock["token"] = token
 
-        # Store lock
-        self._redis.set(
-            self._redis_lock_prefix.format(token), pickle.dumps(lock), ex=int(timeout)
+        # Store lock, locked path reference and index entry
+        self._create_script(
+            keys=[
+                self._redis_lock_prefix.format(token),
+                self._redis_url2token_prefix.format(path),
+                self._redis_index_key,
+            ],
+            args=[pickle.dumps(lock), int(timeout), token, path],
         )
-
-        # Store locked path reference
-        key = self._redis_url2token_prefix.format(path)
-        if not self._redis.exists(key):
-            self._redis.lpush(key, token)
-        else:
-            self._redis.lpush(key, token)
         self._flush()
         _logger.debug(f"LockStorageRedis.set({org_path!r}): {lock_string(lock)}")
         return lock
@@ -159,19 +239,18 @@ class LockStorageRedis:
             Lock dictionary.
             Raises ValueError, if token is invalid.
         """
-        assert self._redis.exists(self._redis_lock_prefix.format(token))
         assert timeout == -1 or timeout > 0
         if timeout < 0 or timeout > LockStorageRedis.LOCK_TIME_OUT_MAX:
             timeout = LockStorageRedis.LOCK_TIME_OUT_MAX
 
-        # Note: shelve dictionary returns copies, so we must reassign
-        # values:
-        lock = pickle.loads(self._redis.get(self._redis_lock_prefix.format(token)))
+        key = self._redis_lock_prefix.format(token)
+        lock = self._redis.get(key)
+        assert lock is not None, "Lock must exist"
+        lock = pickle.loads(lock)
         lock["timeout"] = timeout
         lock["expire"] = time.time() + timeout
-        self._redis.set(
-            self._redis_lock_prefix.format(token), pickle.dumps(lock), ex=int(timeout)
-        )
+        # xx: don't re-create the lock, if it was deleted in the meantime
+        self._redis.set(key, pickle.dumps(lock), ex=int(timeout), xx=True)
         self._flush()
         return lock
 
@@ -184,13 +263,71 @@ class LockStorageRedis:
             return False
         lock = pickle.loads(lock)
         _logger.debug(f"delete {lock_string(lock)}")
-        # Remove url to lock mapping
-        key = self._redis_url2token_prefix.format(lock.get("root"))
-        self._redis.lrem(key, 1, token)
-        self._redis.delete(self._redis_lock_prefix.format(token))
+        # Remove url to lock mapping and the lock
+        self._remove_tokens(lock.get("root"), [token], delete_locks=True)
         self._flush()
         return True
 
+    def _get_child_paths(self, path):
+        """Return all locked paths below <path> (not including <path>)."""
+        prefix = (path.rstrip("/") + "/").encode("utf-8")
+        # b"\xff" never occurs in UTF-8, so this is the end of the prefix range
+        child_paths = self._redis.zrangebylex(
+            self._redis_index_key, b"[" + prefix, b"(" + prefix + b"\xff"
+        )
+        return [p.decode("utf-8") for p in child_paths if p.decode("utf-8") != path]
+
+    def _get_locks_for_paths(self, paths, *, indexed=False):
+        """Return {path: [lock, ...]} with the valid direct locks of all paths.
+
+        indexed:
+            True: paths were read from the index, so paths without tokens are
+            stale index entries.
+
+        This needs three round trips, independent of the number of paths and
+        locks: LRANGE (pipelined), MGET, and purging of stale tokens (pipelined).
+        """
+        pipe = self._redis.pipeline(transaction=False)
+        for path in paths:
+            pipe.lrange(self._redis_url2token_prefix.format(path), 0, -1)
+        token_lists = [[t.decode("utf-8") for t in tl] for tl in pipe.execute()]
+
+        all_tokens = [t for tl in token_lists for t in tl]
+        values = {}
+        if all_tokens:
+            values = dict(
+                zip(
+                    all_tokens,
+                    self._redis.mget(
+                        [self._redis_lock_prefix.format(t) for t in all_tokens]
+                    ),
+                )
+            )
+
+        now = time.time()
+        res = {}
+        pipe = self._redis.pipeline(transaction=False)
+        purge = False
+        for path, tokens in zip(paths, token_lists):
+            locks = []
+            stale = []
+            for token in tokens:
+                value = values[token]
+                lock = pickle.loads(value) if value is not None else None
+                if lock is None or 0 <= float(lock["expire"]) < now:
+                    stale.append(token)
+                else:
+                    locks.append(lock)
+            if stale or (indexed and not tokens):
+                # Tokens of timed-out locks, or an index entry without tokens
+                _logger.debug(f"Purging {len(stale)} stale lock(s) of {path}")
+                self._remove_tokens(path, stale, delete_locks=True, client=pipe)
+                purge = True
+            res[path] = locks
+        if purge:
+            pipe.execute()
+        return res
+
     def get_lock_list(self, path, *, include_root, include_children, token_only):
         """Return a list of direct locks for <path>.
         Expired locks are *not* returned (but may be purged).
@@ -211,28 +348,40 @@ class LockStorageRedis:
         assert path and path.startswith("/")
         assert include_root or include_children
 
-        def __appendLocks(toklist):
-            # Since we can do this quickly, we use self.get() even if
-            # token_only is set, so expired locks are purged.
-            for token in map(lambda x: x.decode("utf-8"), toklist):
-                lock = self._redis.get(self._redis_lock_prefix.format(token))
-                if lock:
-                    lock = pickle.loads(lock)
-                    if token_only:
-                        lockList.append(lock["token"])
-                    else:
-                        lockList.append(lock)
-
         path = normalize_lock_root(path)
-        key = self._redis_url2token_prefix.format(path)
-
-        tokList = self._redis.lrange(key, 0, -1)
-        lockList = []
+        lock_lists = []
         if include_root:
-            __appendLocks(tokList)
-
+            lock_lists.extend(self._get_locks_for_paths([path]).values())
         if include_children:
-            for u in map(lambda x: x.decode("utf-8"), self._redis.keys(key + "/*")):
-                if util.is_child_uri(key, u):
-                    __appendLocks(self._redis.lrange(u, 0, -1))
+            child_paths = self._get_child_paths(path)
+            lock_lists.extend(
+                self._get_locks_for_paths(child_paths, indexed=True).values()
+            )
+
+        lockList = []
+        for locks in lock_lists:
+            if token_only:
+                lockList.extend(lock["token"] for lock in locks)
+            else:
+                lockList.extend(locks)
         return lockList
+
+    def get_lock_lists(self, path_list, *, token_only):
+        """Return the direct locks for multiple paths in one call.
+        Expired locks are *not* returned (but may be purged).
+        path_list:
+            Iterable of paths (utf8 encoded string)
+        token_only:
+            True: only lists of tokens are returned.
+        Returns:
+            Dictionary {path: list of valid lock dictionaries (may be empty)},
+            keyed by the paths as passed.
+        """
+        path_list = list(path_list)
+        norm_paths = list({normalize_lock_root(p) for p in path_list})
+        lock_lists = self._get_locks_for_paths(norm_paths)
+        res = {}
+        for path in path_list:
+            locks = lock_lists[normalize_lock_root(path)]
+            res[path] = [lock["token"] for lock in locks] if token_only else locks
+        return res
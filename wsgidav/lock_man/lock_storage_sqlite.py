@@ -0,0 +1,334 @@
+# (c) 2009-2024 Martin Wendt and contributors; see WsgiDAV https://github.com/mar10/wsgidav
+# Original PyFileServer (c) 2005 Ho Chun Wei.
+# Licensed under the MIT license:
+# http://www.opensource.org/licenses/mit-license.php
+"""
+Implements a lock storage provider for `LockManager` using SQLite.
+
+The database runs in WAL mode, so all worker processes on one host can share
+the locks without an external server. The locks table is indexed by token,
+root path and expiration date:
+
+- Locks of a subtree are found by a range scan on the root path.
+- Expired locks are purged in batches.
+- A conflict check and the following create() can be run in one
+  write_transaction(), which is serialized across processes.
+
+See :class:`~wsgidav.lock_man.lock_manager.LockManager`
+"""
+import itertools
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+from wsgidav import util
+from wsgidav.lock_man.lock_manager import (
+    generate_lock_token,
+    lock_string,
+    normalize_lock_root,
+    validate_lock,
+)
+
+__docformat__ = "reStructuredText"
+
+_logger = util.get_module_logger("wsgidav.lock_man")
+
+_LOCK_FIELDS = (
+    "token",
+    "root",
+    "type",
+    "scope",
+    "depth",
+    "owner",
+    "principal",
+    "timeout",
+    "expire",
+)
+_SELECT_LOCKS = "SELECT {} FROM locks".format(", ".join(_LOCK_FIELDS))
+
+
+# ========================================================================
+# LockStorageSQLite
+# ========================================================================
+class LockStorageSQLite:
+    """
+    A persistent lock manager storage that can be shared by multiple processes.
+
+    storage_path:
+        Path of the SQLite database file (created if missing).
+    """
+
+    LOCK_TIME_OUT_DEFAULT = 604800  # 1 week, in seconds
+    LOCK_TIME_OUT_MAX = 4 * 604800  # 1 month, in seconds
+    #: Purge expired locks after this many create() calls
+    PURGE_INTERVAL = 100
+    #: Max. number of paths per query in get_lock_lists()
+    MAX_QUERY_PATHS = 500
+
+    def __init__(self, storage_path):
+        self._storage_path = os.path.abspath(storage_path)
+        self._local = None
+        # Shared by all threads: next() on a count is atomic
+        self._create_count = itertools.count(1)
+
+    def __repr__(self):
+        return f"LockStorageSQLite({self._storage_path!r})"
+
+    def _get_connection(self):
+        # Connections can't be shared between threads or forked processes
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(
+                self._storage_path, timeout=10, isolation_level=None
+            )
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS locks ("
+                "token TEXT PRIMARY KEY, root TEXT NOT NULL, type TEXT, "
+                "scope TEXT, depth TEXT, owner BLOB, principal TEXT, "
+                "timeout REAL, expire REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS locks_root ON locks (root)")
+            conn.execute("CREATE INDEX IF NOT EXISTS locks_expire ON locks (expire)")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def _query_locks(self, where, args=()):
+        """Return a list of valid lock dictionaries."""
+        rows = self._get_connection().execute(
+            f"{_SELECT_LOCKS} WHERE ({where}) AND expire >= ?",
+            (*args, time.time()),
+        )
+        return [dict(zip(_LOCK_FIELDS, row)) for row in rows]
+
+    def open(self):
+        """Called before first use.
+
+        May be implemented to initialize a storage.
+        """
+        assert self._local is None
+        self._local = threading.local()
+        self._get_connection()
+
+    def close(self):
+        """Called on shutdown."""
+        if self._local is not None:
+            conn = getattr(self._local, "conn", None)
+            if conn is not None and self._local.pid == os.getpid():
+                conn.close()
+            self._local = None
+
+    def cleanup(self):
+        """Purge expired locks."""
+        count = (
+            self._get_connection()
+            .execute("DELETE FROM locks WHERE expire < ?", (time.time(),))
+            .rowcount
+        )
+        if count:
+            _logger.debug(f"Purged {count} expired lock(s)")
+        return count
+
+    def clear(self):
+        """Delete all entries."""
+        was_closed = self._local is None
+        if was_closed:
+            self.open()
+        self._get_connection().execute("DELETE FROM locks")
+        if was_closed:
+            self.close()
+
+    @contextmanager
+    def write_transaction(self):
+        """Run the enclosed storage calls in one transaction.
+
+        Other processes can't create or delete locks in the meantime, so a
+        conflict check and the following create() are atomic.
+        """
+        conn = self._get_connection()
+        if conn.in_transaction:
+            yield
+            return
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+
+    def get(self, token):
+        """Return a lock dictionary for a token.
+
+        If the lock does not exist or is expired, None is returned.
+
+        token:
+            lock token
+        Returns:
+            Lock dictionary or <None>
+        """
+        locks = self._query_locks("token = ?", (token,))
+        return locks[0] if locks else None
+
+    def create(self, path, lock):
+        """Create a direct lock for a resource path.
+
+        path:
+            Normalized path (utf8 encoded string, no trailing '/')
+        lock:
+            lock dictionary, without a token entry
+        Returns:
+            New unique lock token.: <lock
+
+        **Note:** the lock dictionary may be modified on return:
+
+        - lock['root'] is ignored and set to the normalized <path>
+        - lock['timeout'] may be normalized and shorter than requested
+        - lock['token'] is added
+        """
+        # We expect only a lock definition, not an existing lock
+        assert lock.get("token") is None
+        assert lock.get("expire") is None, "Use timeout instead of expire"
+        assert path and "/" in path
+
+        # Normalize root: /foo/bar
+        org_path = path
+        path = normalize_lock_root(path)
+        lock["root"] = path
+
+        # Normalize timeout from ttl to expire-date
+        timeout = lock.get("timeout")
+        if timeout is None:
+            timeout = LockStorageSQLite.LOCK_TIME_OUT_DEFAULT
+        else:
+            timeout = float(timeout)
+        if timeout < 0 or timeout > LockStorageSQLite.LOCK_TIME_OUT_MAX:
+            timeout = LockStorageSQLite.LOCK_TIME_OUT_MAX
+
+        lock["timeout"] = timeout
+        lock["expire"] = time.time() + timeout
+
+        validate_lock(lock)
+
+        lock["token"] = generate_lock_token()
+
+        self._get_connection().execute(
+            "INSERT INTO locks ({}) VALUES ({})".format(
+                ", ".join(_LOCK_FIELDS), ", ".join("?" * len(_LOCK_FIELDS))
+            ),
+            tuple(lock[name] for name in _LOCK_FIELDS),
+        )
+        if next(self._create_count) % self.PURGE_INTERVAL == 0:
+            self.cleanup()
+        _logger.debug(f"LockStorageSQLite.set({org_path!r}): {lock_string(lock)}")
+        return lock
+
+    def refresh(self, token, *, timeout):
+        """Modify an existing lock's timeout.
+
+        token:
+            Valid lock token.
+        timeout:
+            Suggested lifetime in seconds (-1 for infinite).
+            The real expiration time may be shorter than requested!
+        Returns:
+            Lock dictionary.
+        """
+        assert timeout == -1 or timeout > 0
+        if timeout < 0 or timeout > LockStorageSQLite.LOCK_TIME_OUT_MAX:
+            timeout = LockStorageSQLite.LOCK_TIME_OUT_MAX
+
+        expire = time.time() + timeout
+        count = (
+            self._get_connection()
+            .execute(
+                "UPDATE locks SET timeout = ?, expire = ? WHERE token = ?",
+                (timeout, expire, token),
+            )
+            .rowcount
+        )
+        assert count == 1, "Lock must exist"
+        return self.get(token)
+
+    def delete(self, token):
+        """Delete lock.
+
+        Returns True on success. False, if token does not exist.
+        """
+        count = (
+            self._get_connection()
+            .execute("DELETE FROM locks WHERE token = ?", (token,))
+            .rowcount
+        )
+        _logger.debug(f"delete {token}: {count}")
+        return count > 0
+
+    def get_lock_list(self, path, *, include_root, include_children, token_only):
+        """Return a list of direct locks for <path>.
+
+        Expired locks are *not* returned.
+
+        path:
+            Normalized path (utf8 encoded string, no trailing '/')
+        include_root:
+            False: don't add <path> lock (only makes sense, when include_children
+            is True).
+        include_children:
+            True: Also check all sub-paths for existing locks.
+        token_only:
+            True: only a list of token is returned.
+        Returns:
+            List of valid lock dictionaries (may be empty).
+        """
+        assert util.is_str(path)
+        assert path and path.startswith("/")
+        assert include_root or include_children
+
+        path = normalize_lock_root(path)
+        lockList = []
+        if include_root:
+            lockList.extend(self._query_locks("root = ?", (path,)))
+        if include_children:
+            # All paths that start with '<path>/' sort between '<path>/' and
+            # '<path>0' ('0' is the character after '/')
+            prefix = path.rstrip("/") + "/"
+            lockList.extend(
+                self._query_locks(
+                    "root > ? AND root < ?", (prefix, prefix[:-1] + "0")
+                )
+            )
+        if token_only:
+            return [lock["token"] for lock in lockList]
+        return lockList
+
+    def get_lock_lists(self, path_list, *, token_only):
+        """Return the direct locks for multiple paths in one call.
+
+        Expired locks are *not* returned.
+
+        path_list:
+            Iterable of paths (utf8 encoded string)
+        token_only:
+            True: only lists of tokens are returned.
+        Returns:
+            Dictionary {path: list of valid lock dictionaries (may be empty)},
+            keyed by the paths as passed.
+        """
+        path_list = list(path_list)
+        norm_paths = list({normalize_lock_root(p) for p in path_list})
+        lock_lists = {p: [] for p in norm_paths}
+        for i in range(0, len(norm_paths), self.MAX_QUERY_PATHS):
+            chunk = norm_paths[i : i + self.MAX_QUERY_PATHS]
+            where = "root IN ({})".format(", ".join("?" * len(chunk)))
+            for lock in self._query_locks(where, chunk):
+                lock_lists[lock["root"]].append(lock)
+
+        res = {}
+        for path in path_list:
+            locks = lock_lists[normalize_lock_root(path)]
+            res[path] = [lock["token"] for lock in locks] if token_only else locks
+        return res
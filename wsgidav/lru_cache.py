@@ -0,0 +1,116 @@
+"""
+LRUCache
+
+Small thread-safe LRU cache with optional per-entry time-to-live.
+
+Used by the Seafile provider and domain controller to keep results of
+expensive RPCs and object loads across requests of one worker process.
+"""
+import time
+from collections import OrderedDict
+from threading import Lock
+
+__docformat__ = "reStructuredText"
+
+_MISSING = object()
+
+
+class LRUCache:
+    """Mapping with a bounded number of entries.
+
+    The least recently used entry is evicted when `max_size` is exceeded.
+    If `ttl` is set, entries expire `ttl` seconds after they were stored.
+    If `max_cost` is set, entries are also evicted while the sum of the
+    `cost` values passed to `set()` exceeds it (e.g. an estimated size in
+    bytes).
+
+    A `max_size` of None means no limit on the number of entries (only
+    useful with `max_cost`). A `max_size` of 0 disables the cache: `set()`
+    is a no-op and `get()` always misses.
+    """
+
+    def __init__(self, max_size, *, ttl=None, max_cost=None):
+        assert max_size is None or max_size >= 0
+        assert ttl is None or ttl >= 0
+        assert max_cost is None or max_cost >= 0
+        self.max_size = max_size
+        self.ttl = ttl
+        self.max_cost = max_cost
+        self.total_cost = 0
+        self._data = OrderedDict()  # {key: (expire, cost, value)}
+        self._lock = Lock()
+
+    def __repr__(self):
+        return (
+            f"{self.__class__.__name__}(size={len(self._data)}/{self.max_size}, "
+            f"cost={self.total_cost}/{self.max_cost}, ttl={self.ttl})"
+        )
+
+    def __len__(self):
+        return len(self._data)
+
+    def __contains__(self, key):
+        return self.get(key, _MISSING) is not _MISSING
+
+    def get(self, key, default=None):
+        """Return the cached value for `key` (and mark it as recently used)."""
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return default
+            expire, cost, value = entry
+            if expire is not None and expire < time.monotonic():
+                del self._data[key]
+                self.total_cost -= cost
+                return default
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value, *, cost=0):
+        """Store `value` for `key`, evicting the oldest entries if necessary."""
+        if self.max_size == 0:
+            return
+        if self.max_cost is not None and cost > self.max_cost:
+            # Would evict everything else and still not fit
+            self.pop(key)
+            return
+        expire = None
+        if self.ttl is not None:
+            expire = time.monotonic() + self.ttl
+        with self._lock:
+            prev = self._data.pop(key, None)
+            if prev is not None:
+                self.total_cost -= prev[1]
+            self._data[key] = (expire, cost, value)
+            self.total_cost += cost
+            while (self.max_size is not None and len(self._data) > self.max_size) or (
+                self.max_cost is not None and self.total_cost > self.max_cost
+            ):
+                _, (_, old_cost, _) = self._data.popitem(last=False)
+                self.total_cost -= old_cost
+
+    def pop(self, key, default=None):
+        """Remove `key` and return its value (expired or not)."""
+        with self._lock:
+            entry = self._data.pop(key, None)
+            if entry is None:
+                return default
+            self.total_cost -= entry[1]
+        return entry[2]
+
+    def remove_if(self, predicate):
+        """Remove all entries for which `predicate(key, value)` is true.
+
+        Returns the number of removed entries.
+        """
+        with self._lock:
+            keys = [k for k, (_, _, v) in self._data.items() if predicate(k, v)]
+            for key in keys:
+                self.total_cost -= self._data.pop(key)[1]
+        return len(keys)
+
+    def clear(self):
+        """Remove all entries."""
+        with self._lock:
+            self._data.clear()
+            self.total_cost = 0
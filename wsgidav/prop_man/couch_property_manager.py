@@ -194,8 +194,13 @@ class CouchPropertyManager:
         del doc["properties"][name]
         self.db.save(doc)
 
-    def remove_properties(self, norm_url, environ=None):
-        _logger.debug("remove_properties(%s)" % norm_url)
+    def remove_properties(self, norm_url, environ=None, *, with_children=False):
+        _logger.debug(f"remove_properties({norm_url}, {with_children})")
+        if with_children:
+            # Match URLs that are equal to <norm_url> or begin with '<norm_url>/'
+            for doc in list(self._find_descendents(norm_url)):
+                self.db.delete(doc)
+            return
         doc = self._find(norm_url)
         if doc:
             self.db.delete(doc)
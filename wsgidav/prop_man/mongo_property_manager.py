@@ -153,8 +153,14 @@ class MongoPropertyManager:
         del doc[encode_mongo_key(name)]
         self.collection.save(doc)
 
-    def remove_properties(self, norm_url, environ=None):
-        _logger.debug("remove_properties(%s)" % norm_url)
+    def remove_properties(self, norm_url, environ=None, *, with_children=False):
+        _logger.debug(f"remove_properties({norm_url}, {with_children})")
+        if with_children:
+            # Match URLs that are equal to <norm_url> or begin with '<norm_url>/'
+            matchBegin = "^" + norm_url.rstrip("/") + "/"
+            query = {"$or": [{"_url": norm_url}, {"_url": {"$regex": matchBegin}}]}
+            self.collection.remove(query)
+            return
         doc = self.collection.find_one({"_url": norm_url})
         if doc:
             self.collection.remove(doc)
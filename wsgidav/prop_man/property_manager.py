@@ -204,14 +204,24 @@ class PropertyManager:
         finally:
             self._lock.release()
 
-    def remove_properties(self, norm_url, environ=None):
-        _logger.debug(f"remove_properties({norm_url})")
+    def remove_properties(self, norm_url, environ=None, *, with_children=False):
+        _logger.debug(f"remove_properties({norm_url}, {with_children})")
         self._lock.acquire_write()
         try:
             if not self._loaded:
                 self._lazy_open()
-            if norm_url in self._dict:
-                del self._dict[norm_url]
+            if with_children:
+                # Remove norm_url\*
+                urls = [
+                    url
+                    for url in self._dict.keys()
+                    if util.is_equal_or_child_uri(norm_url, url)
+                ]
+            else:
+                urls = [norm_url] if norm_url in self._dict else []
+            for url in urls:
+                del self._dict[url]
+            if urls:
                 self._sync()
         finally:
             self._lock.release()
@@ -0,0 +1,235 @@
+# (c) 2009-2024 Martin Wendt and contributors; see WsgiDAV https://github.com/mar10/wsgidav
+# Licensed under the MIT license:
+# http://www.opensource.org/licenses/mit-license.php
+"""
+Implements a property manager based on SQLite.
+
+Every dead property is one row, keyed by (url, name), so writing a property
+doesn't rewrite the other properties of the resource. The database runs in
+WAL mode, so all worker processes on one host can share it.
+
+The properties of a subtree are found by a range scan on the url, so
+recursive move and delete don't iterate over all entries.
+
+Usage::
+
+    property_manager:
+        class: wsgidav.prop_man.sqlite_property_manager.SQLitePropertyManager
+        kwargs:
+            storage_path: /path/to/wsgidav_props.db
+"""
+import os
+import pickle
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+from wsgidav import util
+from wsgidav.prop_man.property_manager import PropertyManager
+
+__docformat__ = "reStructuredText"
+
+_logger = util.get_module_logger("wsgidav.prop_man")
+
+
+def _subtree_condition(url):
+    """Return (SQL condition, args) that match <url> and all its children.
+
+    All urls that start with '<url>/' sort between '<url>/' and '<url>0'
+    ('0' is the character after '/').
+    """
+    base = url.rstrip("/")
+    return "(url = ? OR (url >= ? AND url < ?))", (base, base + "/", base + "0")
+
+
+# ========================================================================
+# SQLitePropertyManager
+# ========================================================================
+class SQLitePropertyManager(PropertyManager):
+    """
+    A persistent property manager that can be shared by multiple processes.
+
+    storage_path:
+        Path of the SQLite database file (created if missing).
+    """
+
+    #: Max. number of urls per query in get_properties_for_urls()
+    MAX_QUERY_URLS = 500
+
+    def __init__(self, storage_path):
+        self._storage_path = os.path.abspath(storage_path)
+        self._local = threading.local()
+        super().__init__()
+
+    def __repr__(self):
+        return f"SQLitePropertyManager({self._storage_path})"
+
+    def _get_connection(self):
+        # Connections can't be shared between threads or forked processes
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(
+                self._storage_path, timeout=10, isolation_level=None
+            )
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS properties ("
+                "url TEXT NOT NULL, name TEXT NOT NULL, value BLOB NOT NULL, "
+                "PRIMARY KEY (url, name)) WITHOUT ROWID"
+            )
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+            self._loaded = True
+        return conn
+
+    @contextmanager
+    def _transaction(self):
+        """Run the enclosed statements in one transaction."""
+        conn = self._get_connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+
+    def _lazy_open(self):
+        _logger.debug(f"_lazy_open({self._storage_path})")
+        self._get_connection()
+
+    def _close(self):
+        _logger.debug("_close()")
+        conn = getattr(self._local, "conn", None)
+        if conn is not None and self._local.pid == os.getpid():
+            conn.close()
+        self._local = threading.local()
+        self._loaded = False
+
+    def _check(self, msg=""):
+        return True
+
+    def _dump(self, msg=""):
+        _logger.info(f"{self.__class__.__name__}({self.__repr__()}): {msg}")
+        rows = self._get_connection().execute(
+            "SELECT url, name, value FROM properties ORDER BY url, name"
+        )
+        for url, name, value in rows:
+            _logger.info(f"    {url}: {name}: {pickle.loads(value)!r}")
+
+    def clear(self):
+        """Delete all entries."""
+        self._get_connection().execute("DELETE FROM properties")
+
+    def get_properties(self, norm_url, environ=None):
+        _logger.debug(f"get_properties({norm_url})")
+        rows = self._get_connection().execute(
+            "SELECT name FROM properties WHERE url = ?", (norm_url,)
+        )
+        return [row[0] for row in rows]
+
+    def get_properties_for_urls(self, url_list, environ=None):
+        """Return {url: {name: value}} with the dead properties of multiple urls.
+
+        This is used by PROPFIND, to read the properties of all members with
+        a few queries.
+        """
+        url_list = list(url_list)
+        res = {url: {} for url in url_list}
+        conn = self._get_connection()
+        for i in range(0, len(url_list), self.MAX_QUERY_URLS):
+            chunk = url_list[i : i + self.MAX_QUERY_URLS]
+            rows = conn.execute(
+                "SELECT url, name, value FROM properties WHERE url IN ({})".format(
+                    ", ".join("?" * len(chunk))
+                ),
+                chunk,
+            )
+            for url, name, value in rows:
+                res[url][name] = pickle.loads(value)
+        return res
+
+    def get_property(self, norm_url, name, environ=None):
+        _logger.debug(f"get_property({norm_url}, {name})")
+        row = (
+            self._get_connection()
+            .execute(
+                "SELECT value FROM properties WHERE url = ? AND name = ?",
+                (norm_url, name),
+            )
+            .fetchone()
+        )
+        if row is None:
+            return None
+        return pickle.loads(row[0])
+
+    def write_property(
+        self, norm_url, name, property_value, dry_run=False, environ=None
+    ):
+        assert norm_url and norm_url.startswith("/")
+        assert name  # and name.startswith("{")
+        assert property_value is not None
+
+        _logger.debug(
+            f"write_property({norm_url}, {name}, dry_run={dry_run}):\n\t{property_value}"
+        )
+        if dry_run:
+            return  # TODO: can we check anything here?
+
+        self._get_connection().execute(
+            "INSERT OR REPLACE INTO properties (url, name, value) VALUES (?, ?, ?)",
+            (norm_url, name, pickle.dumps(property_value)),
+        )
+
+    def remove_property(self, norm_url, name, dry_run=False, environ=None):
+        """
+        Specifying the removal of a property that does not exist is NOT an error.
+        """
+        _logger.debug(f"remove_property({norm_url}, {name}, dry_run={dry_run})")
+        if dry_run:
+            # TODO: can we check anything here?
+            return
+        self._get_connection().execute(
+            "DELETE FROM properties WHERE url = ? AND name = ?", (norm_url, name)
+        )
+
+    def remove_properties(self, norm_url, environ=None, *, with_children=False):
+        _logger.debug(f"remove_properties({norm_url}, {with_children})")
+        if with_children:
+            cond, args = _subtree_condition(norm_url)
+            self._get_connection().execute(
+                f"DELETE FROM properties WHERE {cond}", args
+            )
+        else:
+            self._get_connection().execute(
+                "DELETE FROM properties WHERE url = ?", (norm_url,)
+            )
+
+    def copy_properties(self, src_url, dest_url, environ=None):
+        _logger.debug(f"copy_properties({src_url}, {dest_url})")
+        # Replace the properties of dest_url, don't merge them
+        with self._transaction() as conn:
+            conn.execute("DELETE FROM properties WHERE url = ?", (dest_url,))
+            conn.execute(
+                "INSERT INTO properties (url, name, value) "
+                "SELECT ?, name, value FROM properties WHERE url = ?",
+                (dest_url, src_url),
+            )
+
+    def move_properties(self, src_url, dest_url, with_children, environ=None):
+        _logger.debug(f"move_properties({src_url}, {dest_url}, {with_children})")
+        if with_children:
+            # Replace the src_url prefix of all matching urls
+            cond, args = _subtree_condition(src_url)
+            src_len = len(src_url.rstrip("/"))
+            self._get_connection().execute(
+                "UPDATE OR REPLACE properties SET url = ? || substr(url, ?) "
+                f"WHERE {cond}",
+                (dest_url.rstrip("/"), src_len + 1, *args),
+            )
+        else:
+            self._get_connection().execute(
+                "UPDATE OR REPLACE properties SET url = ? WHERE url = ?",
+                (dest_url, src_url),
+            )
@@ -5,7 +5,9 @@
 """
 WSGI application that handles one single WebDAV request.
 """
+from itertools import islice
 from urllib.parse import unquote, urlparse
+from uuid import uuid4
 
 from wsgidav import util, xml_tools
 from wsgidav.dav_error import (
@@ -37,6 +39,8 @@ __docformat__ = "reStructuredText"
 _logger = util.get_module_logger(__name__)
 
 DEFAULT_BLOCK_SIZE = 8192
+#: PROPFIND fetches the locks and dead properties of this many members at once
+PROPFIND_BATCH_SIZE = 100
 
 
 # ========================================================================
@@ -230,6 +234,16 @@ class RequestServer:
 
         if_dict = environ["wsgidav.conditions.if"]
 
+        has_conditionals = (
+            "HTTP_IF_MODIFIED_SINCE" in environ
+            or "HTTP_IF_UNMODIFIED_SINCE" in environ
+            or "HTTP_IF_MATCH" in environ
+            or "HTTP_IF_NONE_MATCH" in environ
+        )
+        if not has_conditionals and "HTTP_IF" not in environ:
+            # Don't call the getters (may be expensive for some providers)
+            return
+
         # Raise HTTP_PRECONDITION_FAILED or HTTP_NOT_MODIFIED, if standard
         # HTTP condition fails
         last_modified = -1  # nonvalid modified time
@@ -240,12 +254,7 @@ class RequestServer:
         if etag is None:
             etag = "[]"  # Non-valid entity tag
 
-        if (
-            "HTTP_IF_MODIFIED_SINCE" in environ
-            or "HTTP_IF_UNMODIFIED_SINCE" in environ
-            or "HTTP_IF_MATCH" in environ
-            or "HTTP_IF_NONE_MATCH" in environ
-        ):
+        if has_conditionals:
             util.evaluate_http_conditionals(res, last_modified, etag, environ)
 
         if "HTTP_IF" not in environ:
@@ -344,31 +353,55 @@ class RequestServer:
 
         # --- Build list of resource URIs
 
-        reslist = res.get_descendants(depth=environ["HTTP_DEPTH"], add_self=True)
+        # Resources are walked and serialized while the response is sent, so
+        # big listings don't have to be held in memory
+        reslist = res.iter_descendants(depth=environ["HTTP_DEPTH"], add_self=True)
         #        if environ["wsgidav.verbose"] >= 3:
         #            pprint(reslist, indent=4)
 
-        multistatusEL = xml_tools.make_multistatus_el()
-        responsedescription = []
-
-        for child in reslist:
-
-            if propFindMode == "allprop":
-                propList = child.get_properties("allprop")
-            elif propFindMode == "name":
-                propList = child.get_properties("name")
-            else:
-                propList = child.get_properties("named", name_list=propNameList)
+        lock_man = self._davProvider.lock_manager
+        prefetch_locks = lock_man is not None and (
+            propFindMode == "allprop" or "{DAV:}lockdiscovery" in propNameList
+        )
+        prop_man = self._davProvider.prop_manager
+        prefetch_dead_props = hasattr(prop_man, "get_properties_for_urls") and (
+            propFindMode in ("allprop", "name")
+            or any(not name.startswith("{DAV:}") for name in propNameList)
+        )
 
-            href = child.get_href()
-            util.add_property_response(multistatusEL, href, propList)
+        def _iter_responses():
+            while True:
+                batch = list(islice(reslist, PROPFIND_BATCH_SIZE))
+                if not batch:
+                    break
+                if prefetch_locks or prefetch_dead_props:
+                    ref_urls = [child.get_ref_url() for child in batch]
+                if prefetch_locks:
+                    # Read by get_property_value("{DAV:}lockdiscovery")
+                    environ["wsgidav.lock_lists"] = lock_man.get_url_lock_lists(
+                        ref_urls
+                    )
+                if prefetch_dead_props:
+                    # Read by get_property_names() and get_property_value()
+                    environ[
+                        "wsgidav.dead_properties"
+                    ] = prop_man.get_properties_for_urls(ref_urls, environ)
+                yield from _iter_batch_responses(batch)
+
+        def _iter_batch_responses(batch):
+            for child in batch:
+
+                if propFindMode == "allprop":
+                    propList = child.get_properties("allprop")
+                elif propFindMode == "name":
+                    propList = child.get_properties("name")
+                else:
+                    propList = child.get_properties("named", name_list=propNameList)
 
-        if responsedescription:
-            etree.SubElement(multistatusEL, "{DAV:}responsedescription").text = (
-                "\n".join(responsedescription)
-            )
+                href = child.get_href()
+                yield href, propList
 
-        return util.send_multi_status_response(environ, start_response, multistatusEL)
+        return util.send_multi_status_stream(environ, start_response, _iter_responses())
 
     def do_PROPPATCH(self, environ, start_response):
         """Handle PROPPATCH request to set or remove a property.
@@ -700,7 +733,7 @@ class RequestServer:
 
         if isnewfile:
             self._check_write_permission(parentRes, "0", environ)
-            res = parentRes.create_empty_resource(util.get_uri_name(path))
+            res = parentRes.prepare_new_resource(util.get_uri_name(path))
         else:
             self._check_write_permission(res, "0", environ)
 
@@ -1503,6 +1536,7 @@ class RequestServer:
                     do_ignore_ranges = True
 
         is_partial_ranges = False
+        multipart_ranges = None
         if "HTTP_RANGE" in environ and not do_ignore_ranges:
             is_partial_ranges = True
             list_ranges, _totallength = util.obtain_content_ranges(
@@ -1512,16 +1546,38 @@ class RequestServer:
                 # No valid ranges present
                 self._fail(HTTP_RANGE_NOT_SATISFIABLE, "No valid ranges present")
 
-            # More than one range present -> take only the first range, since
-            # multiple range returns require multipart, which is not supported
-            # obtain_content_ranges supports more than one range in case the above
-            # behaviour changes in future
+            if len(list_ranges) > 1:
+                # More than one (non-overlapping) range present: send a
+                # multipart/byteranges response, parts in ascending order
+                multipart_ranges = sorted(list_ranges)
             (range_start, range_end, range_length) = list_ranges[0]
         else:
             (range_start, range_end, range_length) = (0, filesize - 1, filesize)
 
         # Content Processing
         mimetype = res.get_content_type()  # provider.get_content_type(path)
+        content_type = mimetype
+
+        if multipart_ranges:
+            # See https://www.rfc-editor.org/rfc/rfc7233#section-4.1
+            boundary = uuid4().hex
+            content_type = f"multipart/byteranges; boundary={boundary}"
+            part_headers = [
+                util.to_bytes(
+                    f"--{boundary}\r\n"
+                    f"Content-Type: {mimetype}\r\n"
+                    f"Content-Range: bytes {start}-{end}/{filesize}\r\n\r\n"
+                )
+                for (start, end, _length) in multipart_ranges
+            ]
+            multipart_trailer = util.to_bytes(f"--{boundary}--\r\n")
+            # Each part is followed by CRLF
+            range_length = len(multipart_trailer) + sum(
+                len(header) + length + 2
+                for header, (_start, _end, length) in zip(
+                    part_headers, multipart_ranges
+                )
+            )
 
         response_headers = []
         if res.support_content_length():
@@ -1531,7 +1587,7 @@ class RequestServer:
             response_headers.append(
                 ("Last-Modified", util.get_rfc1123_time(last_modified))
             )
-        response_headers.append(("Content-Type", mimetype))
+        response_headers.append(("Content-Type", content_type))
         response_headers.append(("Date", util.get_rfc1123_time()))
         if res.support_etag():
             response_headers.append(("ETag", f'"{etag}"'))
@@ -1546,7 +1602,9 @@ class RequestServer:
 
         res.finalize_headers(environ, response_headers)
 
-        if is_partial_ranges:
+        if multipart_ranges:
+            start_response("206 Partial Content", response_headers)
+        elif is_partial_ranges:
             response_headers.append(
                 (
                     "Content-Range",
@@ -1563,31 +1621,47 @@ class RequestServer:
             return
 
         fileobj = res.get_content()
+        # Streams that read ahead are told where the requested range ends
+        limit_read_ahead = getattr(fileobj, "limit_read_ahead", None)
 
-        if not do_ignore_ranges:
-            fileobj.seek(range_start)
-
-        contentlengthremaining = range_length
         try:
-            while 1:
-                if (
-                    contentlengthremaining < 0
-                    or contentlengthremaining > self.block_size
+            if multipart_ranges:
+                for part_header, (start, _end, length) in zip(
+                    part_headers, multipart_ranges
                 ):
-                    readbuffer = fileobj.read(self.block_size)
-                else:
-                    readbuffer = fileobj.read(contentlengthremaining)
-                assert util.is_bytes(readbuffer)
-                yield readbuffer
-                contentlengthremaining -= len(readbuffer)
-                if len(readbuffer) == 0 or contentlengthremaining == 0:
-                    break
+                    yield part_header
+                    fileobj.seek(start)
+                    if limit_read_ahead:
+                        limit_read_ahead(start + length)
+                    yield from self._read_content(fileobj, length)
+                    yield b"\r\n"
+                yield multipart_trailer
+            else:
+                if not do_ignore_ranges:
+                    fileobj.seek(range_start)
+                    if limit_read_ahead:
+                        limit_read_ahead(range_start + range_length)
+                yield from self._read_content(fileobj, range_length)
         finally:
             # yield readbuffer MAY fail with a GeneratorExit error
             # we still need to close the file
             fileobj.close()
         return
 
+    def _read_content(self, fileobj, length):
+        """Yield `length` bytes (-1: until EOF) from fileobj in chunks."""
+        contentlengthremaining = length
+        while 1:
+            if contentlengthremaining < 0 or contentlengthremaining > self.block_size:
+                readbuffer = fileobj.read(self.block_size)
+            else:
+                readbuffer = fileobj.read(contentlengthremaining)
+            assert util.is_bytes(readbuffer)
+            yield readbuffer
+            contentlengthremaining -= len(readbuffer)
+            if len(readbuffer) == 0 or contentlengthremaining == 0:
+                break
+
 
 #    def do_TRACE(self, environ, start_response):
 #        """ TODO: TRACE pending, but not essential."""
@@ -2,12 +2,21 @@ from wsgidav.dav_error import DAVError, HTTP_BAD_REQUEST, HTTP_FORBIDDEN, \
     HTTP_NOT_FOUND, HTTP_INTERNAL_ERROR, HTTP_TOO_MANY_FILES_IN_LIBRARY
 
 from wsgidav.dav_provider import DAVProvider, DAVCollection, DAVNonCollection
-from threading import Timer, Lock
+from threading import Lock, BoundedSemaphore, Event
+from concurrent.futures import ThreadPoolExecutor
 
 import wsgidav.util as util
+from wsgidav.lru_cache import LRUCache
+from wsgidav.block_index import BlockIndex
+from bisect import bisect_right
+from array import array
+import copy
+import fnmatch
+import hashlib
+import json
 import os
-import time
 import posixpath
+import re
 import unicodedata
 
 import tempfile
@@ -28,109 +37,476 @@ SYNCHRONOUS = 1
 
 INFINITE_QUOTA = -2
 
+# Accessible repo lists (and their RepoNameIndex) are cached per
+# (username, org_id, is_guest).
+# Changes made through this worker invalidate the affected entries at once,
+# changes from other clients become visible after at most REPO_CACHE_TTL seconds.
+REPO_CACHE_TTL = float(os.environ.get('SEAFDAV_REPO_CACHE_TTL', 5))
+REPO_CACHE_SIZE = int(os.environ.get('SEAFDAV_REPO_CACHE_SIZE', 1000))
+
+_repo_list_cache = LRUCache(REPO_CACHE_SIZE, ttl=REPO_CACHE_TTL)
+
+# Commits and fs objects are content-addressed and never change, so these
+# caches need no invalidation, only a bound on the memory they may use.
+COMMIT_CACHE_SIZE = int(os.environ.get('SEAFDAV_COMMIT_CACHE_SIZE', 10000))
+DIR_CACHE_MEMORY = int(os.environ.get('SEAFDAV_DIR_CACHE_MEMORY_MB', 64)) * 1024 * 1024
+
+_commit_root_cache = LRUCache(COMMIT_CACHE_SIZE)
+_seafdir_cache = LRUCache(None, max_cost=DIR_CACHE_MEMORY)
+
+# Resolved paths are cached per (repo_id, head commit, rel_path). A new head
+# commit means a new key, so entries never go stale.
+PATH_CACHE_MEMORY = int(os.environ.get('SEAFDAV_PATH_CACHE_MEMORY_MB', 32)) * 1024 * 1024
+
+_path_cache = LRUCache(None, max_cost=PATH_CACHE_MEMORY)
+# Marks paths that don't exist in _path_cache
+_NOT_FOUND = object()
+_NOT_FOUND_COST = 256
+
+# Clients keep probing for these names (case-insensitive fnmatch patterns,
+# separated by ','). Reading them returns 404 at once if the parent directory
+# is cached and has no such entry; existing files are served as usual.
+# Set to '' to disable.
+IGNORED_NAMES = os.environ.get(
+    'SEAFDAV_IGNORED_NAMES',
+    'desktop.ini,Thumbs.db,._*,.DS_Store,.hidden,autorun.inf')
+
+_ignored_names_re = None
+_ignored_patterns = [pat.strip().lower() for pat in IGNORED_NAMES.split(',') if pat.strip()]
+if _ignored_patterns:
+    _ignored_names_re = re.compile('|'.join(fnmatch.translate(pat) for pat in _ignored_patterns))
+
+_READ_METHODS = ('GET', 'HEAD', 'PROPFIND')
+
+# File mtimes of directories in version 0 repos (get_files_last_modified walks
+# the commit history), cached per (repo_id, head commit, directory).
+MTIME_CACHE_MEMORY = int(os.environ.get('SEAFDAV_MTIME_CACHE_MEMORY_MB', 8)) * 1024 * 1024
+
+_dir_mtimes_cache = LRUCache(None, max_cost=MTIME_CACHE_MEMORY)
+
+# While a block is streamed, the next READ_AHEAD_BLOCKS blocks of the file are
+# loaded on a shared thread pool. READ_AHEAD_MAX_BLOCKS caps the number of
+# prefetched blocks held by all streams of a worker process.
+READ_AHEAD_BLOCKS = int(os.environ.get('SEAFDAV_READ_AHEAD_BLOCKS', 2))
+READ_AHEAD_THREADS = int(os.environ.get('SEAFDAV_READ_AHEAD_THREADS', 8))
+READ_AHEAD_MAX_BLOCKS = int(os.environ.get('SEAFDAV_READ_AHEAD_MAX_BLOCKS', 64))
+
+_read_ahead_slots = BoundedSemaphore(READ_AHEAD_MAX_BLOCKS)
+
+# Block end offsets of files, shared by all workers on this host, so only the
+# first ranged GET of a file has to stat its blocks. Set to '' to disable.
+BLOCK_INDEX_PATH = os.environ.get('SEAFDAV_BLOCK_INDEX_PATH',
+                                  os.path.join(SEAFILE_DATA_DIR, 'webdav_block_index.db'))
+BLOCK_INDEX_MAX_FILES = int(os.environ.get('SEAFDAV_BLOCK_INDEX_MAX_FILES', 100000))
+# In-memory cache of block offsets in front of the shared index
+BLOCK_MAP_MEMORY = int(os.environ.get('SEAFDAV_BLOCK_MAP_MEMORY_MB', 16)) * 1024 * 1024
+_read_ahead_pool = None
+_read_ahead_pool_lock = Lock()
+
+# With STREAMING_UPLOAD, PUT bodies are cut into UPLOAD_BLOCK_SIZE blocks that
+# are written straight into the block storage while the request is read, and
+# the file is committed from these blocks. This avoids spooling the whole body
+# to a temp file and chunking it again. Only usable with the filesystem block
+# backend, BLOCK_STORAGE_DIR must be its 'blocks' directory.
+STREAMING_UPLOAD = os.environ.get('SEAFDAV_STREAMING_UPLOAD', '').lower() in ('1', 'true', 'yes')
+UPLOAD_BLOCK_SIZE = int(os.environ.get('SEAFDAV_UPLOAD_BLOCK_SIZE_MB', 8)) * 1024 * 1024
+BLOCK_STORAGE_DIR = os.environ.get('SEAFDAV_BLOCK_STORAGE_DIR',
+                                   os.path.join(SEAFILE_DATA_DIR, 'storage', 'blocks'))
+
+# Rough memory use of loaded fs objects
+_FS_OBJ_BASE_COST = 512
+_SEAFDIRENT_COST = 256
+_BLOCK_ID_COST = 96
+_MTIME_ENTRY_COST = 160
+
+
+def _fs_obj_cost(obj):
+    if isinstance(obj, SeafDir):
+        return _FS_OBJ_BASE_COST + _SEAFDIRENT_COST * len(obj.dirents)
+    return _FS_OBJ_BASE_COST + _BLOCK_ID_COST * len(obj.blocks)
+
 
 def sort_repo_list(repos):
     return sorted(repos, key=lambda r: r.id)
 
 
-class BlockMap(object):
+class RepoNameIndex:
+    """Name lookup tables for one snapshot of a user's accessible repos.
+
+    A repo can be addressed by its plain name or by the disambiguated
+    form ``<name>-<repo_id[:6]>``. If several repos share a plain name,
+    the plain name resolves to the first of them in list order.
+    """
+    def __init__(self, repos):
+        self.repos = repos
+        self.repo_ids = set()
+        self.by_name = {}
+        self.by_unique_name = {}
+        self._name_groups = {}
+        self._member_names = {}
+        for repo in repos:
+            self.repo_ids.add(repo.id)
+            self.by_name.setdefault(repo.name, repo)
+            self.by_unique_name.setdefault(repo.name + "-" + repo.id[:6], repo)
+            self._name_groups.setdefault(repo.name, []).append(repo)
+
+    def lookup(self, name):
+        repo = self.by_name.get(name)
+        if repo is None:
+            repo = self.by_unique_name.get(name)
+        return repo
+
+    def get_member_names(self, show_repo_id):
+        """Return a list of (member name, repo) tuples for the root listing."""
+        members = self._member_names.get(show_repo_id)
+        if members is None:
+            members = []
+            for r_list in self._name_groups.values():
+                if len(r_list) == 1:
+                    repo = r_list[0]
+                    unique_name = repo.name
+                    if show_repo_id:
+                        unique_name = repo.name + "-" + repo.id[:6]
+                    members.append((unique_name, repo))
+                else:
+                    for repo in sort_repo_list(r_list):
+                        members.append((repo.name + "-" + repo.id[:6], repo))
+            self._member_names[show_repo_id] = members
+        return members
+
+
+class _PendingLoad:
+    """A load of block offsets that other threads wait for."""
     def __init__(self):
-        self.block_sizes = []
-        self.timestamp = time.time()
+        self.done = Event()
+        self.error = None
+
+
+class BlockMapCache:
+    """Worker-wide LRU cache of block end offsets per file object.
+
+    offsets[i] is the end offset of block i, i.e. the sum of the sizes of
+    blocks 0..i. The offsets of a file are computed by one thread at a time:
+    concurrent seekers on the same file wait for it (and get its error if
+    it fails), while unrelated files never wait for each other.
+    """
+    def __init__(self, max_memory, block_index=None):
+        self.block_index = block_index
+        self._cache = LRUCache(None, max_cost=max_memory)
+        self._building = {}  # {obj_id: _PendingLoad}
+        self._lock = Lock()
+
+    def __repr__(self):
+        return "%s(%r, %r)" % (self.__class__.__name__, self._cache, self.block_index)
+
+    def get_offsets(self, file_obj):
+        obj_id = file_obj.obj_id
+        while True:
+            offsets = self._cache.get(obj_id)
+            if offsets is not None:
+                return offsets
+
+            with self._lock:
+                pending = self._building.get(obj_id)
+                is_builder = pending is None
+                if is_builder:
+                    pending = self._building[obj_id] = _PendingLoad()
+
+            if not is_builder:
+                # Check the cache again once the builder is done
+                pending.done.wait()
+                if pending.error is not None:
+                    raise pending.error
+                continue
+
+            try:
+                offsets = self._load_offsets(file_obj)
+                self._cache.set(obj_id, offsets, cost=64 + offsets.itemsize * len(offsets))
+                return offsets
+            except Exception as e:
+                pending.error = e
+                raise
+            finally:
+                with self._lock:
+                    del self._building[obj_id]
+                pending.done.set()
+
+    def _load_offsets(self, file_obj):
+        if self.block_index:
+            offsets = self.block_index.get(file_obj.obj_id)
+            if offsets is not None and len(offsets) == len(file_obj.blocks):
+                return offsets
+
+        offsets = array('Q')
+        end = 0
+        for block_id in file_obj.blocks:
+            end += block_mgr.stat_block(file_obj.store_id, file_obj.version, block_id)
+            offsets.append(end)
+
+        if self.block_index:
+            self.block_index.put(file_obj.obj_id, offsets)
+        return offsets
+
+
+def _get_read_ahead_pool():
+    # Created on first use, because the provider is instantiated before
+    # the server forks its worker processes.
+    global _read_ahead_pool
+    with _read_ahead_pool_lock:
+        if _read_ahead_pool is None:
+            _read_ahead_pool = ThreadPoolExecutor(max_workers=READ_AHEAD_THREADS,
+                                                  thread_name_prefix="seafdav-read-ahead")
+    return _read_ahead_pool
+
+
+def _release_read_ahead_slot(future):
+    _read_ahead_slots.release()
 
 
 class SeafileStream(object):
     '''Implements basic file-like interface'''
-    def __init__(self, file_obj, block_map, block_map_lock):
+    def __init__(self, file_obj, block_map):
         self.file_obj = file_obj
         self.block = None
         self.block_idx = 0
         self.block_offset = 0
         self.block_map = block_map
-        self.block_map_lock = block_map_lock
+        self.prefetched = {}  # {block_idx: Future}
+        # Index of the first block that won't be read (None: read until EOF)
+        self.read_ahead_stop = None
 
-    def read(self, size):
+    def _load_block(self, idx):
+        future = self.prefetched.pop(idx, None)
+        if future is not None:
+            try:
+                block = future.result()
+            finally:
+                _read_ahead_slots.release()
+        else:
+            block = block_mgr.load_block(self.file_obj.store_id,
+                                         self.file_obj.version,
+                                         self.file_obj.blocks[idx])
+        self._prefetch(idx + 1)
+        return block
+
+    def _prefetch(self, start):
+        """Start loading the blocks following the current one in background."""
+        if READ_AHEAD_BLOCKS <= 0:
+            return
+        blocks = self.file_obj.blocks
+        stop = min(start + READ_AHEAD_BLOCKS, len(blocks))
+        if self.read_ahead_stop is not None:
+            stop = min(stop, self.read_ahead_stop)
+        for idx in range(start, stop):
+            if idx in self.prefetched:
+                continue
+            # Don't wait for a free slot, just stream without read-ahead
+            if not _read_ahead_slots.acquire(blocking=False):
+                break
+            self.prefetched[idx] = _get_read_ahead_pool().submit(
+                block_mgr.load_block, self.file_obj.store_id,
+                self.file_obj.version, blocks[idx])
+
+    def _discard_prefetched(self, keep=()):
+        for idx in list(self.prefetched):
+            if idx in keep:
+                continue
+            future = self.prefetched.pop(idx)
+            future.cancel()
+            # Give the slot back once the load is cancelled or finished
+            future.add_done_callback(_release_read_ahead_slot)
+
+    def _next_chunks(self, size):
+        """Yield memoryview slices of the loaded blocks, `size` bytes in total.
+
+        A block that is consumed as a whole is yielded as is (without copying).
+        """
         remain = size
         blocks = self.file_obj.blocks
-        ret = b''
 
-        while True:
-            if not self.block:
+        while remain > 0:
+            if self.block is None:
                 if self.block_idx == len(blocks):
                     break
-                self.block = block_mgr.load_block(self.file_obj.store_id,
-                                                  self.file_obj.version,
-                                                  blocks[self.block_idx])
-
-            if self.block_offset + remain >= len(self.block):
+                self.block = self._load_block(self.block_idx)
+                if self.block is None:
+                    # Content-Length was already sent: don't return a short body
+                    raise DAVError(HTTP_INTERNAL_ERROR,
+                                   "Failed to load block %s" % blocks[self.block_idx])
+                if not self.block:
+                    # Empty block: skip it
+                    self.block = None
+                    self.block_idx += 1
+                    continue
+
+            block_len = len(self.block)
+            if self.block_offset + remain >= block_len:
+                if self.block_offset == 0:
+                    chunk = self.block
+                else:
+                    chunk = memoryview(self.block)[self.block_offset:]
+                remain -= (block_len - self.block_offset)
                 self.block_idx += 1
-                ret += self.block[self.block_offset:]
-                remain -= (len(self.block) - self.block_offset)
                 self.block = None
                 self.block_offset = 0
             else:
-                ret += self.block[self.block_offset:self.block_offset + remain]
+                chunk = memoryview(self.block)[self.block_offset:self.block_offset + remain]
                 self.block_offset += remain
                 remain = 0
+            yield chunk
 
-            if remain == 0:
-                break
+    def read(self, size):
+        chunks = list(self._next_chunks(size))
+        if len(chunks) == 1 and isinstance(chunks[0], bytes):
+            return chunks[0]
+        # Copy the data exactly once
+        return b''.join(chunks)
+
+    def readinto(self, b):
+        """Read up to len(b) bytes into the writable buffer `b`.
 
-        return ret
+        Returns the number of bytes read (0 at end of file).
+        """
+        view = memoryview(b).cast('B')
+        pos = 0
+        for chunk in self._next_chunks(len(view)):
+            n = len(chunk)
+            view[pos:pos + n] = chunk
+            pos += n
+        return pos
 
     def close(self):
-        pass
+        self._discard_prefetched()
+
+    def limit_read_ahead(self, end):
+        """Only read ahead blocks that start before byte offset `end`.
+
+        Called after seek() with the end of the requested range, so small
+        ranged reads don't load blocks that are never sent.
+        """
+        if end >= self.file_obj.size:
+            self.read_ahead_stop = None
+            return
+        offsets = self.block_map.get_offsets(self.file_obj)
+        # One past the block that contains the last byte
+        self.read_ahead_stop = bisect_right(offsets, end - 1) + 1 if end > 0 else 0
+        self._discard_prefetched(keep=range(self.block_idx, self.read_ahead_stop))
 
     def seek(self, pos):
         self.block = None
         self.block_idx = 0
         self.block_offset = 0
+        self.read_ahead_stop = None
 
         current_pos = pos
         if current_pos == 0:
+            self._discard_prefetched()
             return
 
-        with self.block_map_lock:
-            if self.file_obj.obj_id not in self.block_map:
-                block_map = BlockMap()
-                for i in range(len(self.file_obj.blocks)):
-                    block_size = block_mgr.stat_block(self.file_obj.store_id, self.file_obj.version, self.file_obj.blocks[i])
-                    block_map.block_sizes.append(block_size)
-                self.block_map[self.file_obj.obj_id] = block_map
-            block_map = self.block_map[self.file_obj.obj_id]
-            block_map.timestamp = time.time()
-
-        while current_pos > 0:
-            if self.block_idx == len(self.file_obj.blocks):
-                break
-            block_size = block_map.block_sizes[self.block_idx]
-            if current_pos >= block_size:
-                self.block_idx += 1
-                current_pos -= block_size
-                self.block_offset = 0
+        offsets = self.block_map.get_offsets(self.file_obj)
+        self.block_idx = bisect_right(offsets, current_pos)
+        if self.block_idx < len(offsets):
+            if self.block_idx > 0:
+                self.block_offset = current_pos - offsets[self.block_idx - 1]
             else:
                 self.block_offset = current_pos
-                current_pos = 0
+
+        self._discard_prefetched(
+            keep=range(self.block_idx, self.block_idx + READ_AHEAD_BLOCKS + 1))
+
+
+class SeafileBlockWriter:
+    """Write-only file object that stores its data as Seafile blocks.
+
+    Every UPLOAD_BLOCK_SIZE bytes, a block is hashed and written to the
+    block storage of `store_id` (unless a block with that id exists
+    already). After close(), `block_ids`, `block_paths` and `size`
+    describe the file to commit.
+    """
+    def __init__(self, store_id, block_size=UPLOAD_BLOCK_SIZE):
+        self.store_id = store_id
+        self.block_size = block_size
+        self.buf = bytearray()
+        self.block_ids = []
+        self.block_paths = []
+        self.size = 0
+        self.closed = False
+
+    def write(self, data):
+        self.buf += data
+        self.size += len(data)
+        while len(self.buf) >= self.block_size:
+            self._store_block(self.buf[:self.block_size])
+            del self.buf[:self.block_size]
+        return len(data)
+
+    def writelines(self, lines):
+        for data in lines:
+            self.write(data)
+
+    def close(self):
+        if self.closed:
+            return
+        self.closed = True
+        if self.buf:
+            self._store_block(self.buf)
+            self.buf = bytearray()
+
+    def _store_block(self, data):
+        block_id = hashlib.sha1(data).hexdigest()
+        block_dir = os.path.join(BLOCK_STORAGE_DIR, self.store_id, block_id[:2])
+        path = os.path.join(block_dir, block_id[2:])
+        if not os.path.exists(path):
+            os.makedirs(block_dir, exist_ok=True)
+            # Write under a temp name, so readers never see partial blocks
+            fd, tmp_path = tempfile.mkstemp(dir=block_dir, prefix='.seafdav-')
+            try:
+                with os.fdopen(fd, 'wb') as f:
+                    f.write(data)
+                os.rename(tmp_path, path)
+            except BaseException:
+                os.unlink(tmp_path)
+                raise
+        self.block_ids.append(block_id)
+        self.block_paths.append(path)
 
 
 class SeafileResource(DAVNonCollection):
 
-    def __init__(self, path, repo, rel_path, obj, environ, block_map={}, block_map_lock=None):
+    def __init__(self, path, repo, rel_path, obj, environ, block_map=None, dirent=None):
         super(SeafileResource, self).__init__(path, environ)
         self.repo = repo
         self.rel_path = rel_path
         self._file_path: str = rel_path
-        self.obj = obj
+        # With a dirent, the SeafFile is only loaded when it is needed
+        self._obj = obj
+        self.dirent = dirent
+        self.last_modified = None
         self.username = environ.get("http_authenticator.username", "")
         self.org_id = environ.get("seafile.org_id", "")
         self.is_guest = environ.get("seafile.is_guest", False)
         self.tmpfile_path = None
+        self.block_writer = None
         self.owner = None
         self.block_map = block_map
-        self.block_map_lock = block_map_lock
+
+    @property
+    def obj(self):
+        if self._obj is None and self.dirent is not None:
+            self._obj = fs_mgr.load_seafile(self.repo.store_id, self.repo.version,
+                                            self.dirent.id)
+        return self._obj
+
+    @obj.setter
+    def obj(self, obj):
+        self._obj = obj
+        self.dirent = None
+        self.last_modified = None
 
     # Getter methods for standard live properties
     def get_content_length(self):
+        if self.dirent is not None and getattr(self.dirent, 'size', -1) >= 0:
+            return self.dirent.size
         return self.obj.size
 
     def get_content_type(self):
@@ -151,15 +527,20 @@ class SeafileResource(DAVNonCollection):
         return self.name
 
     def get_etag(self):
+        if self.dirent is not None:
+            return self.dirent.id
         return self.obj.obj_id
 
     def is_link(self):
         return os.path.islink(self._file_path)
 
     def get_last_modified(self):
-        cached_mtime = getattr(self.obj, 'last_modified', None)
-        if cached_mtime:
-            return cached_mtime
+        if self.last_modified:
+            return self.last_modified
+
+        dent_mtime = getattr(self.dirent, 'mtime', None)
+        if dent_mtime is not None and dent_mtime > 0:
+            return dent_mtime
 
         obj_mtime = getattr(self.obj, 'mtime', None)
         if obj_mtime is not None and obj_mtime > 0:
@@ -168,15 +549,7 @@ class SeafileResource(DAVNonCollection):
         # XXX: What about not return last modified for files in v0 repos,
         # since they can be too expensive sometimes?
         parent, filename = os.path.split(self.rel_path)
-        try:
-            mtimes = seafile_api.get_files_last_modified(self.repo.id, parent, -1)
-        except SearpcError as e:
-            raise DAVError(HTTP_INTERNAL_ERROR, e.msg)
-        for mtime in mtimes:
-            if (mtime.file_name == filename):
-                return mtime.last_modified
-
-        return None
+        return get_dir_file_mtimes(self.repo, parent).get(filename)
 
     def support_etag(self):
         return True
@@ -190,7 +563,9 @@ class SeafileResource(DAVNonCollection):
         See DAVResource.getContent()
         """
         assert not self.is_collection
-        return SeafileStream(self.obj, self.block_map, self.block_map_lock)
+        # Members created from a parent collection don't get a block map passed
+        block_map = self.block_map or self.provider.block_map
+        return SeafileStream(self.obj, block_map)
 
     def check_repo_owner_quota(self, isnewfile=True, contentlength=-1):
         """Check if the upload would cause the user quota be exceeded
@@ -208,7 +583,9 @@ class SeafileResource(DAVNonCollection):
                 else:
                     return True
             else:
-                delta = contentlength - self.obj.size
+                delta = contentlength
+                if self.obj is not None:
+                    delta -= self.obj.size
                 return seafile_api.check_quota(self.repo.id, delta) >= 0
         except SearpcError as e:
             raise DAVError(HTTP_INTERNAL_ERROR, e.msg)
@@ -231,30 +608,66 @@ class SeafileResource(DAVNonCollection):
         if not self.check_repo_owner_quota(isnewfile, contentlength):
             raise DAVError(HTTP_FORBIDDEN, "The quota of the repo owner is exceeded")
 
+        if STREAMING_UPLOAD:
+            self.block_writer = SeafileBlockWriter(self.repo.store_id)
+            return self.block_writer
+
         fd, path = tempfile.mkstemp(dir=self.provider.tmpdir)
         self.tmpfile_path = path
         return os.fdopen(fd, "wb")
 
     def end_write(self, with_errors, isnewfile=True):
+        block_writer = self.block_writer
+        self.block_writer = None
         try:
             if not with_errors:
                 parent, filename = os.path.split(self.rel_path)
-                contentlength = os.stat(self.tmpfile_path).st_size
+                if block_writer is not None:
+                    contentlength = block_writer.size
+                else:
+                    contentlength = os.stat(self.tmpfile_path).st_size
                 if not self.check_repo_owner_quota(isnewfile=isnewfile, contentlength=contentlength):
-                    if self.tmpfile_path:
-                        try:
-                            os.unlink(self.tmpfile_path)
-                        finally:
-                            self.tmpfile_path = None
                     raise DAVError(HTTP_FORBIDDEN, "The quota of the repo owner is exceeded")
-                seafile_api.put_file(self.repo.id, self.tmpfile_path, parent, filename,
-                                     self.username, None)
+                if block_writer is not None and block_writer.block_ids:
+                    # Creates or replaces the file.
+                    # Blocks that are never committed are removed by the GC
+                    seafile_api.post_file_blocks(self.repo.id, parent, filename,
+                                                 json.dumps(block_writer.block_ids),
+                                                 json.dumps(block_writer.block_paths),
+                                                 self.username, contentlength, 1)
+                elif self.obj is None:
+                    # New file from prepare_new_resource(): one commit.
+                    # The file may have been created after the path was resolved
+                    # (concurrent PUT, other client, stale cached head), so
+                    # replace it instead of failing or adding a renamed copy.
+                    if block_writer is not None:
+                        # Empty body
+                        fd, self.tmpfile_path = tempfile.mkstemp(dir=self.provider.tmpdir)
+                        os.close(fd)
+                    seafile_api.post_multi_files(self.repo.id, parent,
+                                                 json.dumps([filename]),
+                                                 json.dumps([self.tmpfile_path]),
+                                                 self.username, 1)
+                else:
+                    if block_writer is not None:
+                        # Empty body: nothing to commit from blocks
+                        fd, self.tmpfile_path = tempfile.mkstemp(dir=self.provider.tmpdir)
+                        os.close(fd)
+                    seafile_api.put_file(self.repo.id, self.tmpfile_path, parent, filename,
+                                         self.username, None)
+                invalidate_repo_list_cache(self.repo.id)
+                self.provider.invalidate_resource_memo(self.environ)
                 # **Reload the SeafFile object to pick up the new obj_id (ETag)**
                 repo, rel_path, new_obj = resolvePath(self.path, self.username,
                                                       self.org_id, self.is_guest)
                 self.obj = new_obj
+                self.repo = repo
         except SearpcError as e:
-            raise DAVError(HTTP_INTERNAL_ERROR, e.msg)
+            if e.msg == 'Invalid file name':
+                raise DAVError(HTTP_BAD_REQUEST, e.msg) from e
+            if e.msg == 'Too many files in library.':
+                raise DAVError(HTTP_TOO_MANY_FILES_IN_LIBRARY, e.msg) from e
+            raise DAVError(HTTP_INTERNAL_ERROR, e.msg) from e
         finally:
             if self.tmpfile_path:
                 try:
@@ -276,6 +689,8 @@ class SeafileResource(DAVNonCollection):
 
             parent, filename = os.path.split(self.rel_path)
             seafile_api.del_file(self.repo.id, parent, '[\"' + filename + '\"]', self.username)
+            invalidate_repo_list_cache(self.repo.id)
+            self.provider.invalidate_resource_memo(self.environ)
 
             self.remove_all_properties(recursive=True)
             self.remove_all_locks(recursive=True)
@@ -317,6 +732,8 @@ class SeafileResource(DAVNonCollection):
             seafile_api.move_file(self.repo.id, src_dir, '[\"' + src_file + '\"]',
                                   dest_repo.id, dest_dir, '[\"' + dest_file + '\"]',
                                   1, self.username, NEED_PROGRESS, SYNCHRONOUS)
+            invalidate_repo_list_cache(self.repo.id, dest_repo.id)
+            self.provider.invalidate_resource_memo(self.environ)
         except SearpcError as e:
             raise DAVError(HTTP_INTERNAL_ERROR, e.msg)
 
@@ -351,6 +768,8 @@ class SeafileResource(DAVNonCollection):
             seafile_api.copy_file(self.repo.id, src_dir, '[\"' + src_file + '\"]',
                                   dest_repo.id, dest_dir, '[\"' + dest_file + '\"]',
                                   self.username, NEED_PROGRESS, SYNCHRONOUS)
+            invalidate_repo_list_cache(dest_repo.id)
+            self.provider.invalidate_resource_memo(self.environ)
         except SearpcError as e:
             raise DAVError(HTTP_INTERNAL_ERROR, e.msg)
 
@@ -359,16 +778,35 @@ class SeafileResource(DAVNonCollection):
 
 class SeafDirResource(DAVCollection):
 
-    def __init__(self, path, repo, rel_path, obj, environ):
+    def __init__(self, path, repo, rel_path, obj, environ, dirent=None):
         super(SeafDirResource, self).__init__(path, environ)
         self.repo = repo
         self.rel_path = rel_path
         self._file_path: str = rel_path
-        self.obj = obj
+        # With a dirent (or for a repo root), the SeafDir is only loaded when
+        # it is needed
+        self._obj = obj
+        self.dirent = dirent
+        self.last_modified = None
         self.username = environ.get("http_authenticator.username", "")
         self.org_id = environ.get("seafile.org_id", "")
         self.is_guest = environ.get("seafile.is_guest", False)
 
+    @property
+    def obj(self):
+        if self._obj is None:
+            if self.dirent is not None:
+                self._obj = load_seafdir(self.repo.store_id, self.repo.version, self.dirent.id)
+            elif not self.rel_path:
+                self._obj = get_repo_root_seafdir(self.repo)
+        return self._obj
+
+    @obj.setter
+    def obj(self, obj):
+        self._obj = obj
+        self.dirent = None
+        self.last_modified = None
+
     # Getter methods for standard live properties
     def get_creation_date(self):
         # return int(time.time())
@@ -381,17 +819,37 @@ class SeafDirResource(DAVCollection):
         return None
 
     def get_etag(self):
+        if not self.rel_path:
+            # Repo root: changes with every commit, no need to load the root
+            return self.repo.head_cmmt_id
+        if self.dirent is not None:
+            return self.dirent.id
         return self.obj.obj_id
 
     def get_last_modified(self):
         if not self.rel_path:
             # is repo
             return self.repo.last_modified
-        else:
-            # is folder
+
+        # is folder: use the mtime from the parent's dirent if we have it,
+        # either from get_member_list() / get_member() or from resolvePath()
+        if self.last_modified:
+            return self.last_modified
+
+        dent_mtime = getattr(self.dirent, 'mtime', None)
+        if dent_mtime is not None and dent_mtime > 0:
+            return dent_mtime
+
+        obj_mtime = getattr(self.obj, 'mtime', None)
+        if obj_mtime is not None and obj_mtime > 0:
+            return obj_mtime
+
+        try:
             dir_obj = seafile_api.get_dirent_by_path(self.repo.id,
                                                      self.rel_path)
-            return dir_obj.mtime
+        except SearpcError as e:
+            raise DAVError(HTTP_INTERNAL_ERROR, e.msg) from e
+        return dir_obj.mtime
 
     def is_link(self):
         return os.path.islink(self._file_path)
@@ -407,49 +865,43 @@ class SeafDirResource(DAVCollection):
     def get_member(self, name):
         member_rel_path = "/".join([self.rel_path, name])
         member_path = "/".join([self.path, name])
-        member = self.obj.lookup(name)
+        dent = self.obj.lookup_dent(name)
 
-        if not member:
+        if dent is None:
             raise DAVError(HTTP_NOT_FOUND)
 
-        if isinstance(member, SeafFile):
-            return SeafileResource(member_path, self.repo, member_rel_path,
-                                   member, self.environ)
-        else:
+        if dent.is_dir():
             return SeafDirResource(member_path, self.repo, member_rel_path,
-                                   member, self.environ)
+                                   None, self.environ, dirent=dent)
+        else:
+            return SeafileResource(member_path, self.repo, member_rel_path,
+                                   None, self.environ, dirent=dent)
 
     def get_member_list(self):
         member_list = []
         d = self.obj
 
         if d.version == 0:
-            file_mtimes = []
-            try:
-                file_mtimes = seafile_api.get_files_last_modified(self.repo.id, self.rel_path, -1)
-            except SearpcError as e:
-                raise DAVError(HTTP_INTERNAL_ERROR, e.msg)
-
-            mtimes = {}
-            for entry in file_mtimes:
-                mtimes[entry.file_name] = entry.last_modified
+            mtimes = get_dir_file_mtimes(self.repo, self.rel_path)
         for name, dent in d.dirents.items():
             member_path = posixpath.join(self.path, name)
             member_rel_path = posixpath.join(self.rel_path, name)
 
+            # Properties are answered from the dirent, fs objects are loaded
+            # only if a member's content is accessed
             if dent.is_dir():
-                obj = fs_mgr.load_seafdir(d.store_id, d.version, dent.id)
-                res = SeafDirResource(member_path, self.repo, member_rel_path, obj, self.environ)
+                res = SeafDirResource(member_path, self.repo, member_rel_path,
+                                      None, self.environ, dirent=dent)
             elif dent.is_file():
-                obj = fs_mgr.load_seafile(d.store_id, d.version, dent.id)
-                res = SeafileResource(member_path, self.repo, member_rel_path, obj, self.environ)
+                res = SeafileResource(member_path, self.repo, member_rel_path,
+                                      None, self.environ, dirent=dent)
             else:
                 continue
 
             if d.version == 1:
-                obj.last_modified = dent.mtime
+                res.last_modified = dent.mtime
             else:
-                obj.last_modified = mtimes[name]
+                res.last_modified = mtimes.get(name)
 
             member_list.append(res)
 
@@ -462,20 +914,12 @@ class SeafDirResource(DAVCollection):
         See DAVResource.createEmptyResource()
         """
         assert "/" not in name
-        if self.provider.readonly:
-            raise DAVError(HTTP_FORBIDDEN)
-
-        try:
-            if seafile_api.check_permission_by_path(self.repo.id, self.rel_path, self.username) != "rw":
-                raise DAVError(HTTP_FORBIDDEN)
-
-            if seafile_api.check_quota(self.repo.id) < 0:
-                raise DAVError(HTTP_FORBIDDEN, "The quota of the repo owner is exceeded")
-        except SearpcError as e:
-            raise DAVError(HTTP_INTERNAL_ERROR, e.msg)
+        self._check_create_file()
 
         try:
             seafile_api.post_empty_file(self.repo.id, self.rel_path, name, self.username)
+            invalidate_repo_list_cache(self.repo.id)
+            self.provider.invalidate_resource_memo(self.environ)
         except Exception as e:
             if e.msg == 'Invalid file name':
                 raise DAVError(HTTP_BAD_REQUEST, e.msg)
@@ -500,6 +944,34 @@ class SeafDirResource(DAVCollection):
 
         return SeafileResource(member_path, repo, member_rel_path, obj, self.environ)
 
+    def prepare_new_resource(self, name):
+        """Return a member resource that is created by its end_write().
+
+        This stores a new file with a single commit, instead of committing
+        an empty file first and then its content.
+
+        See DAVResource.prepare_new_resource()
+        """
+        assert "/" not in name
+        self._check_create_file()
+
+        member_rel_path = "/".join([self.rel_path, name])
+        member_path = "/".join([self.path, name])
+        return SeafileResource(member_path, self.repo, member_rel_path, None, self.environ)
+
+    def _check_create_file(self):
+        if self.provider.readonly:
+            raise DAVError(HTTP_FORBIDDEN)
+
+        try:
+            if seafile_api.check_permission_by_path(self.repo.id, self.rel_path, self.username) != "rw":
+                raise DAVError(HTTP_FORBIDDEN)
+
+            if seafile_api.check_quota(self.repo.id) < 0:
+                raise DAVError(HTTP_FORBIDDEN, "The quota of the repo owner is exceeded")
+        except SearpcError as e:
+            raise DAVError(HTTP_INTERNAL_ERROR, e.msg) from e
+
     def create_collection(self, name):
         """Create a new collection as member of self.
 
@@ -517,6 +989,8 @@ class SeafDirResource(DAVCollection):
                 raise DAVError(HTTP_BAD_REQUEST)
 
             seafile_api.post_dir(self.repo.id, self.rel_path, name, self.username)
+            invalidate_repo_list_cache(self.repo.id)
+            self.provider.invalidate_resource_memo(self.environ)
         except SearpcError as e:
             if e.msg != 'file already exists':
                 raise DAVError(HTTP_INTERNAL_ERROR, e.msg)
@@ -535,6 +1009,8 @@ class SeafDirResource(DAVCollection):
                 raise DAVError(HTTP_BAD_REQUEST)
 
             seafile_api.del_file(self.repo.id, parent, '[\"' + filename + '\"]', self.username)
+            invalidate_repo_list_cache(self.repo.id)
+            self.provider.invalidate_resource_memo(self.environ)
 
             self.remove_all_properties(recursive=True)
             self.remove_all_locks(recursive=True)
@@ -573,6 +1049,8 @@ class SeafDirResource(DAVCollection):
             seafile_api.move_file(self.repo.id, src_dir, '[\"' + src_file + '\"]',
                                   dest_repo.id, dest_dir, '[\"' + dest_file + '\"]',
                                   0, self.username, NEED_PROGRESS, SYNCHRONOUS)
+            invalidate_repo_list_cache(self.repo.id, dest_repo.id)
+            self.provider.invalidate_resource_memo(self.environ)
         except SearpcError as e:
             raise DAVError(HTTP_INTERNAL_ERROR, e.msg)
 
@@ -608,6 +1086,8 @@ class SeafDirResource(DAVCollection):
             seafile_api.copy_file(self.repo.id, src_dir, '[\"' + src_file + '\"]',
                                   dest_repo.id, dest_dir, '[\"' + dest_file + '\"]',
                                   self.username, NEED_PROGRESS, SYNCHRONOUS)
+            invalidate_repo_list_cache(dest_repo.id)
+            self.provider.invalidate_resource_memo(self.environ)
         except SearpcError as e:
             raise DAVError(HTTP_INTERNAL_ERROR, e.msg)
 
@@ -642,27 +1122,8 @@ class RootResource(DAVCollection):
         return None
 
     def get_member_names(self):
-        all_repos = getAccessibleRepos(self.username, self.org_id, self.is_guest)
-
-        name_hash = {}
-        for r in all_repos:
-            r_list = name_hash[r.name]
-            if not r_list:
-                name_hash[r.name] = [r]
-            else:
-                r_list.append(r)
-
-        namelist = []
-        for r_list in name_hash.values():
-            if len(r_list) == 1:
-                repo = r_list[0]
-                namelist.append(repo.name)
-            else:
-                for repo in sort_repo_list(r_list):
-                    unique_name = repo.name + "-" + repo.id[:6]
-                    namelist.append(unique_name)
-
-        return namelist
+        repo_index = getRepoNameIndex(self.username, self.org_id, self.is_guest)
+        return [name for name, repo in repo_index.get_member_names(self.show_repo_id)]
 
     def get_member(self, name):
         repo = getRepoByName(name, self.username, self.org_id, self.is_guest)
@@ -674,36 +1135,18 @@ class RootResource(DAVCollection):
         The default implementation call getMemberNames() then call getMember()
         for each name. This calls getAccessibleRepos() for too many times.
         """
-        all_repos = getAccessibleRepos(self.username, self.org_id, self.is_guest)
-
-        name_hash = {}
-        for r in all_repos:
-            r_list = name_hash.get(r.name, [])
-            if not r_list:
-                name_hash[r.name] = [r]
-            else:
-                r_list.append(r)
+        repo_index = getRepoNameIndex(self.username, self.org_id, self.is_guest)
 
         member_list = []
-        for r_list in name_hash.values():
-            if len(r_list) == 1:
-                repo = r_list[0]
-                unique_name = repo.name
-                if self.show_repo_id:
-                    unique_name = repo.name + "-" + repo.id[:6]
-                res = self._createRootRes(repo, unique_name)
-                member_list.append(res)
-            else:
-                for repo in sort_repo_list(r_list):
-                    unique_name = repo.name + "-" + repo.id[:6]
-                    res = self._createRootRes(repo, unique_name)
-                    member_list.append(res)
+        for unique_name, repo in repo_index.get_member_names(self.show_repo_id):
+            res = self._createRootRes(repo, unique_name)
+            member_list.append(res)
 
         return member_list
 
     def _createRootRes(self, repo, name):
-        obj = get_repo_root_seafdir(repo)
-        return SeafDirResource("/" + name, repo, "", obj, self.environ)
+        # The root dir is loaded when the repo's content is accessed
+        return SeafDirResource("/" + name, repo, "", None, self.environ)
 
     # --- Read / write ---------------------------------------------------------
 
@@ -730,23 +1173,13 @@ class SeafileProvider(DAVProvider):
         self.readonly = readonly
         self.show_repo_id = show_repo_id
         self.tmpdir = os.path.join(SEAFILE_DATA_DIR, "webdavtmp")
-        self.block_map = {}
-        self.block_map_lock = Lock()
-        self.clean_block_map_task_started = False
+        block_index = None
+        if BLOCK_INDEX_PATH:
+            block_index = BlockIndex(BLOCK_INDEX_PATH, max_files=BLOCK_INDEX_MAX_FILES)
+        self.block_map = BlockMapCache(BLOCK_MAP_MEMORY, block_index)
         if not os.access(self.tmpdir, os.F_OK):
             os.mkdir(self.tmpdir)
 
-    def clean_block_map_per_hour(self):
-        delete_items = []
-        with self.block_map_lock:
-            for obj_id, block in self.block_map.items():
-                if time.time() - block.timestamp >= 3600 * 24:
-                    delete_items.append(obj_id)
-            for i in range(len(delete_items)):
-                self.block_map.pop(delete_items[i])
-        t = Timer(3600, self.clean_block_map_per_hour)
-        t.start()
-
     def __repr__(self):
         rw = "Read-Write"
         if self.readonly:
@@ -759,22 +1192,33 @@ class SeafileProvider(DAVProvider):
         See DAVProvider.getResourceInst()
         """
 
-        # start the scheduled task of cleaning up the block map here,
-        # because __init__ runs in a separate process.
-        if not self.clean_block_map_task_started:
-            self.clean_block_map_task_started = True
-            self.clean_block_map_per_hour()
-
         self._count_get_resource_inst += 1
 
+        # The dir browser, request handlers and lock checks resolve the same
+        # paths several times per request
+        memo = self.get_resource_memo(environ)
+        path = path.rstrip("/")
+        try:
+            return memo[path]
+        except KeyError:
+            pass
+        res = self._resolve_resource_inst(path, environ)
+        memo[path] = res
+        return res
+
+    def _resolve_resource_inst(self, path, environ):
         username = environ.get("http_authenticator.username", "")
         org_id = environ.get("seafile.org_id", "")
         is_guest = environ.get("seafile.is_guest", False)
 
-        if path == "/" or path == "":
+        if path == "":
             return RootResource(username, environ, self.show_repo_id)
 
-        path = path.rstrip("/")
+        if (environ.get("REQUEST_METHOD") in _READ_METHODS
+                and is_ignored_name(util.get_uri_name(path))
+                and is_cached_missing(path, username, org_id, is_guest)):
+            return None
+
         try:
             repo, rel_path, obj = resolvePath(path, username, org_id, is_guest)
         except DAVError as e:
@@ -784,7 +1228,33 @@ class SeafileProvider(DAVProvider):
 
         if isinstance(obj, SeafDir):
             return SeafDirResource(path, repo, rel_path, obj, environ)
-        return SeafileResource(path, repo, rel_path, obj, environ, self.block_map, self.block_map_lock)
+        return SeafileResource(path, repo, rel_path, obj, environ, self.block_map)
+
+
+def is_ignored_name(name):
+    """Return True if `name` matches one of the IGNORED_NAMES patterns."""
+    return _ignored_names_re is not None and _ignored_names_re.match(name.lower()) is not None
+
+
+def is_cached_missing(path, username, org_id, is_guest):
+    """Return True if the parent directory of `path` is cached and has no
+    member with that name.
+
+    Only looks at the repo list and path caches, nothing is loaded.
+    """
+    path = unicodedata.normalize('NFC', path)
+    segments = path.strip("/").split("/")
+    if len(segments) < 2:
+        return False
+    repo_index = _repo_list_cache.get((username, org_id, is_guest))
+    if repo_index is None:
+        return False
+    repo = repo_index.lookup(segments[0])
+    if not repo:
+        return False
+    parent_rel_path = "".join("/" + segment for segment in segments[1:-1])
+    parent = _path_cache.get((repo.id, repo.head_cmmt_id, parent_rel_path))
+    return isinstance(parent, SeafDir) and not parent.lookup_dent(segments[-1])
 
 
 def resolvePath(path, username, org_id, is_guest):
@@ -796,24 +1266,10 @@ def resolvePath(path, username, org_id, is_guest):
 
     repo = getRepoByName(repo_name, username, org_id, is_guest)
 
-    rel_path = ""
-    obj = get_repo_root_seafdir(repo)
-
-    n_segs = len(segments)
-    i = 0
-    parent = None
-    for segment in segments:
-        parent = obj
-        obj = parent.lookup(segment)
-
-        if not obj or (isinstance(obj, SeafFile) and i != n_segs - 1):
-            raise DAVError(HTTP_NOT_FOUND)
-
-        rel_path += "/" + segment
-        i += 1
-
-    if parent:
-        obj.mtime = parent.lookup_dent(segment).mtime
+    rel_path = "".join("/" + segment for segment in segments)
+    obj = _resolve_segments(repo, rel_path, segments)
+    if not obj:
+        raise DAVError(HTTP_NOT_FOUND)
 
     return (repo, rel_path, obj)
 
@@ -822,48 +1278,146 @@ def resolveRepoPath(repo, path):
     path = unicodedata.normalize('NFC', path)
     segments = path.strip("/").split("/")
 
+    rel_path = "".join("/" + segment for segment in segments)
+    return _resolve_segments(repo, rel_path, segments)
+
+
+def _resolve_segments(repo, rel_path, segments):
+    """Return the SeafFile or SeafDir at `segments` below the repo root.
+
+    Results (including misses) are cached by head commit and must not be
+    modified by callers.
+    For non-root objects, `mtime` is set from the parent's dirent.
+    Return None if the path does not exist.
+    """
+    key = (repo.id, repo.head_cmmt_id, rel_path)
+    obj = _path_cache.get(key)
+    if obj is _NOT_FOUND:
+        return None
+    if obj is not None:
+        return obj
+
     obj = get_repo_root_seafdir(repo)
 
     n_segs = len(segments)
     i = 0
+    parent = None
     for segment in segments:
-        obj = obj.lookup(segment)
+        parent = obj
+        obj = lookup_member(parent, segment)
 
         if not obj or (isinstance(obj, SeafFile) and i != n_segs - 1):
+            # Probes for missing paths are frequent; the key includes the
+            # head commit, so a later commit creating the path is seen
+            _path_cache.set(key, _NOT_FOUND, cost=_NOT_FOUND_COST)
             return None
 
         i += 1
 
+    if parent:
+        if isinstance(obj, SeafDir):
+            # Don't patch the shared cached object
+            obj = copy.copy(obj)
+        obj.mtime = parent.lookup_dent(segment).mtime
+
+    _path_cache.set(key, obj, cost=_fs_obj_cost(obj))
     return obj
 
 
+def get_dir_file_mtimes(repo, dir_path):
+    """Return {name: last modified} for the entries of a directory.
+
+    Only needed for version 0 repos, whose dirents carry no mtime.
+    The result is shared between requests and must not be modified.
+    """
+    dir_path = "/" + dir_path.strip("/")
+    key = (repo.id, repo.head_cmmt_id, dir_path)
+    mtimes = _dir_mtimes_cache.get(key)
+    if mtimes is None:
+        try:
+            file_mtimes = seafile_api.get_files_last_modified(repo.id, dir_path, -1)
+        except SearpcError as e:
+            raise DAVError(HTTP_INTERNAL_ERROR, e.msg) from e
+        mtimes = {entry.file_name: entry.last_modified for entry in file_mtimes}
+        _dir_mtimes_cache.set(key, mtimes,
+                              cost=_FS_OBJ_BASE_COST + _MTIME_ENTRY_COST * len(mtimes))
+    return mtimes
+
+
 def get_repo_root_seafdir(repo):
-    root_id = commit_mgr.get_commit_root_id(repo.id, repo.version, repo.head_cmmt_id)
-    return fs_mgr.load_seafdir(repo.store_id, repo.version, root_id)
+    key = (repo.id, repo.version, repo.head_cmmt_id)
+    root_id = _commit_root_cache.get(key)
+    if root_id is None:
+        root_id = commit_mgr.get_commit_root_id(repo.id, repo.version, repo.head_cmmt_id)
+        _commit_root_cache.set(key, root_id)
+    return load_seafdir(repo.store_id, repo.version, root_id)
 
 
-def getRepoByName(repo_name, username, org_id, is_guest):
-    repos = getAccessibleRepos(username, org_id, is_guest)
+def load_seafdir(store_id, version, dir_id):
+    """Load a SeafDir through the shared dir object cache.
 
-    ret_repo = None
-    for repo in repos:
-        if repo.name == repo_name:
-            ret_repo = repo
-            break
+    The returned object is shared between requests and must not be modified.
+    """
+    key = (store_id, version, dir_id)
+    seafdir = _seafdir_cache.get(key)
+    if seafdir is None:
+        seafdir = fs_mgr.load_seafdir(store_id, version, dir_id)
+        _seafdir_cache.set(key, seafdir, cost=_fs_obj_cost(seafdir))
+    return seafdir
+
+
+def lookup_member(seafdir, name):
+    """Like SeafDir.lookup(), but load sub directories through the cache."""
+    dent = seafdir.lookup_dent(name)
+    if not dent:
+        return None
+    if dent.is_dir():
+        return load_seafdir(seafdir.store_id, seafdir.version, dent.id)
+    return fs_mgr.load_seafile(seafdir.store_id, seafdir.version, dent.id)
 
-    if not ret_repo:
-        for repo in repos:
-            if repo.name + "-" + repo.id[:6] == repo_name:
-                ret_repo = repo
-                break
-        if not ret_repo:
-            raise DAVError(HTTP_NOT_FOUND)
 
-    return ret_repo
+def getRepoByName(repo_name, username, org_id, is_guest):
+    repo = getRepoNameIndex(username, org_id, is_guest).lookup(repo_name)
+    if not repo:
+        raise DAVError(HTTP_NOT_FOUND)
+
+    return repo
 
 
 def getAccessibleRepos(username, org_id, is_guest):
+    return getRepoNameIndex(username, org_id, is_guest).repos
+
+
+def getRepoNameIndex(username, org_id, is_guest):
+    key = (username, org_id, is_guest)
+    repo_index = _repo_list_cache.get(key)
+    if repo_index is None:
+        repos, complete = _list_accessible_repos(username, org_id, is_guest)
+        repo_index = RepoNameIndex(repos)
+        # Don't keep a partial list around if one of the RPCs failed
+        if complete:
+            _repo_list_cache.set(key, repo_index)
+    return repo_index
+
+
+def invalidate_repo_list_cache(*repo_ids):
+    """Drop cached repo lists that contain one of `repo_ids`.
+
+    The cached repo objects carry the head commit, so they must be dropped
+    after every change made through this worker. Without arguments, all
+    cached lists are dropped.
+    """
+    if not repo_ids:
+        _repo_list_cache.clear()
+        return
+    repo_ids = set(repo_ids)
+    _repo_list_cache.remove_if(
+        lambda key, repo_index: not repo_ids.isdisjoint(repo_index.repo_ids))
+
+
+def _list_accessible_repos(username, org_id, is_guest):
     all_repos = {}
+    complete = True
 
     def addRepo(repo):
         if all_repos.get(repo.repo_id):
@@ -871,9 +1425,11 @@ def getAccessibleRepos(username, org_id, is_guest):
         if not repo.encrypted:
             all_repos[repo.repo_id] = repo
 
+    owned_repos = []
     try:
         owned_repos = get_owned_repos(username, org_id)
     except SearpcError as e:
+        complete = False
         util.warn("Failed to list owned repos: %s" % e.msg)
 
     for orepo in owned_repos:
@@ -883,9 +1439,11 @@ def getAccessibleRepos(username, org_id, is_guest):
             orepo.store_id = orepo.repo_id
             addRepo(orepo)
 
+    shared_repos = []
     try:
         shared_repos = get_share_in_repo_list(username, org_id)
     except SearpcError as e:
+        complete = False
         util.warn("Failed to list shared repos: %s" % e.msg)
 
     for srepo in shared_repos:
@@ -893,9 +1451,11 @@ def getAccessibleRepos(username, org_id, is_guest):
             addRepo(srepo)
             pass
 
+    repos = []
     try:
         repos = get_group_repos(username, org_id)
     except SearpcError:
+        complete = False
         util.warn("Failed to get groups for %s" % username)
     for grepo in repos:
         if grepo:
@@ -905,7 +1465,7 @@ def getAccessibleRepos(username, org_id, is_guest):
         if prepo:
             addRepo(prepo)
 
-    return all_repos.values()
+    return list(all_repos.values()), complete
 
 
 def get_group_repos(username, org_id):
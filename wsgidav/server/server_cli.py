@@ -303,6 +303,10 @@ def _loadSeafileSettings(config):
     provider_mapping['/seafdav'] = SeafileProvider(show_repo_id=True)
     config['provider_mapping'] = provider_mapping
 
+    # Read file content in large chunks, so SeafileStream can hand out whole
+    # blocks without copying them.
+    config.setdefault('block_size', int(os.environ.get('SEAFDAV_BLOCK_SIZE', 1024 * 1024)))
+
     workers = os.environ.get('SEAFDAV_WORKERS', 5)
     config['workers'] = workers
     config['timeout'] = 1200
@@ -36,7 +36,14 @@ from wsgidav.dav_error import (
     as_DAVError,
     get_http_status_string,
 )
-from wsgidav.xml_tools import etree, is_etree_element, make_sub_element, xml_to_bytes
+from wsgidav.xml_tools import (
+    element_to_bytes,
+    etree,
+    is_etree_element,
+    make_multistatus_el,
+    make_sub_element,
+    xml_to_bytes,
+)
 
 __docformat__ = "reStructuredText"
 
@@ -1298,6 +1305,82 @@ def send_multi_status_response(environ, start_response, multistatus_elem):
     return [xml_data]
 
 
+#: Multistatus bodies up to this size are sent with a Content-Length header,
+#: bigger ones are streamed while they are generated.
+MULTI_STATUS_BUFFER_SIZE = 256 * 1024
+
+
+def send_multi_status_stream(environ, start_response, responses):
+    """Send a 207 response, serializing <response> elements as they are produced.
+
+    `responses` is an iterable of (href, prop_list) tuples, see
+    add_property_response().
+    If the body fits into MULTI_STATUS_BUFFER_SIZE, it is sent with a
+    Content-Length. Otherwise the status is sent after the first part has
+    been generated and the rest of the body is streamed (the server uses
+    chunked transfer encoding).
+    """
+    if environ.get("wsgidav.dump_response_body"):
+        multistatus_elem = make_multistatus_el()
+        for href, prop_list in responses:
+            add_property_response(multistatus_elem, href, prop_list)
+        return send_multi_status_response(environ, start_response, multistatus_elem)
+
+    # Split the serialized empty root element into start and end tag:
+    # '<?xml ...?>\n<D:multistatus xmlns:D="DAV:"/>'
+    root = xml_to_bytes(make_multistatus_el(), pretty=False)
+    assert root.endswith(b"/>"), root
+    header = root[:-2].rstrip() + b">"
+    footer = b"</" + header.rsplit(b"<", 1)[1].split(None, 1)[0] + b">"
+
+    def _iter_fragments():
+        for href, prop_list in responses:
+            multistatus_elem = make_multistatus_el()
+            add_property_response(multistatus_elem, href, prop_list)
+            yield element_to_bytes(multistatus_elem[0])
+
+    fragments = _iter_fragments()
+    buffer = [header]
+    size = len(header)
+    for frag in fragments:
+        buffer.append(frag)
+        size += len(frag)
+        if size > MULTI_STATUS_BUFFER_SIZE:
+            break
+    else:
+        # Everything fits: send with Content-Length
+        buffer.append(footer)
+        xml_data = b"".join(buffer)
+        headers = [
+            ("Content-Type", "application/xml; charset=utf-8"),
+            ("Date", get_rfc1123_time()),
+            ("Content-Length", str(len(xml_data))),
+        ]
+        start_response("207 Multi-Status", headers)
+        return [xml_data]
+
+    headers = [
+        ("Content-Type", "application/xml; charset=utf-8"),
+        ("Date", get_rfc1123_time()),
+    ]
+    start_response("207 Multi-Status", headers)
+
+    def _iter_body():
+        chunk = buffer
+        chunk_size = size
+        for frag in fragments:
+            if chunk_size > MULTI_STATUS_BUFFER_SIZE:
+                yield b"".join(chunk)
+                chunk = []
+                chunk_size = 0
+            chunk.append(frag)
+            chunk_size += len(frag)
+        chunk.append(footer)
+        yield b"".join(chunk)
+
+    return _iter_body()
+
+
 def add_property_response(multistatus_elem, href, prop_list):
     """Append <response> element to <multistatus> element.
 
@@ -499,7 +499,17 @@ class WsgiDAVApp:
                 and statusCode not in (204, 304)
             )
             # _logger.info(environ["REQUEST_METHOD"], statusCode, contentLengthRequired)
-            if contentLengthRequired and currentContentLength in (None, ""):
+            if (
+                contentLengthRequired
+                and currentContentLength in (None, "")
+                and environ.get("SERVER_PROTOCOL") == "HTTP/1.1"
+            ):
+                # E.g. a streamed PROPFIND response: the server will use
+                # chunked transfer encoding
+                _logger.debug(
+                    f"No Content-Length header in {statusCode}-response: sending chunked"
+                )
+            elif contentLengthRequired and currentContentLength in (None, ""):
                 # A typical case: a GET request on a virtual resource, for which
                 # the provider doesn't know the length
                 _logger.error(
@@ -82,6 +82,16 @@ def xml_to_bytes(element, *, pretty=False):
     return xml
 
 
+def element_to_bytes(element):
+    """Serialize an element as UTF-8 without XML declaration (e.g. to write
+    a document in parts)."""
+    if use_lxml:
+        return etree.tostring(  # pylint: disable=unexpected-keyword-arg
+            element, encoding="UTF-8", xml_declaration=False
+        )
+    return etree.tostring(element, encoding="utf-8")
+
+
 def make_multistatus_el():
     """Wrapper for etree.Element, that takes care of unsupported nsmap option."""
     if use_lxml: